@@ -386,6 +386,19 @@ function generateHeardleId() {
   return id;
 }
 
+// Pre-trimmed audio for a Heardle: from the start time to the longest clip length
+function heardleSnippetUrl(heardle) {
+  const length = Math.max(...heardle.intervals);
+  return `${AUDIO_SERVICE_URL}/youtube/snippet/${heardle.videoId}?start=${heardle.startTimeSeconds}&length=${length}`;
+}
+
+// Ask the audio service to cut and cache the snippet now, so the first player doesn't wait
+function precomputeHeardleSnippet(heardle) {
+  axios.post(heardleSnippetUrl(heardle), null, { timeout: 10000 }).catch(error => {
+    console.error('Error precomputing heardle snippet:', error.response?.data || error.message);
+  });
+}
+
 // In-memory storage for now (replace with database later)
 
 
@@ -416,6 +429,8 @@ app.post('/api/heardles', async (req, res) => {
       }
     });
     
+    precomputeHeardleSnippet(heardle);
+    
     // Return just the path - frontend will construct full URL
     res.json({ 
       id,
@@ -450,7 +465,8 @@ app.get('/api/heardles/:id', async (req, res) => {
         title: heardle.title,
         artist: heardle.artist,
         thumbnail: heardle.thumbnail,
-        startTimeSeconds: heardle.startTimeSeconds
+        startTimeSeconds: heardle.startTimeSeconds,
+        snippetUrl: heardleSnippetUrl(heardle)
       },
       gameConfig: {
         mode: heardle.mode,
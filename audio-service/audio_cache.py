@@ -0,0 +1,93 @@
+import os
+import tempfile
+from typing import Awaitable, Callable, Optional
+
+from single_flight import SingleFlight
+
+# Directory holding transcoded audio, shared by every request for the same video
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "data/audio")
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+
+class AudioCache:
+    """On-disk cache of audio files, evicted least-recently-used by total bytes.
+
+    A file's mtime is bumped on every hit and used as its last-used time, so the
+    cache needs no index and survives restarts. Concurrent misses for the same
+    key share a single fetch."""
+
+    def __init__(self, directory: str = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._fetches = SingleFlight()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[str], Awaitable[str]]) -> str:
+        """Path of the cached file for key, calling fetch(temp_dir) -> file path on a miss"""
+        path = self.get(key)
+        if path is not None:
+            self.hits += 1
+            return path
+
+        if key not in self._fetches:
+            self.misses += 1
+        return await self._fetches.do(key, lambda: self._fetch(key, fetch))
+
+    async def _fetch(self, key: str, fetch: Callable[[str], Awaitable[str]]) -> str:
+        with tempfile.TemporaryDirectory(dir=self.directory) as temp_dir:
+            fetched = await fetch(temp_dir)
+            path = self.path_for(key)
+            # Atomic within the cache directory, so readers never see a partial file
+            os.replace(fetched, path)
+        self._evict(keep=path)
+        return path
+
+    def _entries(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self, keep: str):
+        files = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            # Files already being streamed stay readable through their open handles
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "in_flight": self._fetches.in_flight(),
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,116 @@
+"""Benchmark WhoSampled page parsing: lxml fast path vs the BeautifulSoup fallback.
+
+Usage (from audio-service/):
+    python benchmarks/whosampled_parse.py                       # synthetic pages
+    python benchmarks/whosampled_parse.py main.html list.html   # saved pages
+
+Saved pages whose name contains "main" are parsed with parse_main_page, the rest
+with parse_list_page. Both backends must produce identical results."""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Parsing doesn't touch the cache - keep the benchmark from creating one on disk
+os.environ.setdefault("WHOSAMPLED_CACHE_PATH", ":memory:")
+
+import whosampled  # noqa: E402
+
+RUNS = int(os.getenv("BENCH_RUNS", "20"))
+
+
+def _rows(count: int, prefix: str) -> str:
+    # Mirrors WhoSampled's table markup, including the image/year cells we don't read
+    return "".join(
+        f'<tr class="{"even" if i % 2 else "odd"}">'
+        f'<td class="tdata__td1"><a href="/{prefix}/{i}/"><img src="/static/{i}.jpg" alt="cover"></a></td>'
+        f'<td class="tdata__td2"><a class="trackName playIcon" href="/Artist-{i % 97}/{prefix}-{i}/">'
+        f'{prefix} Track {i}</a><span class="sampleAction">sampled</span></td>'
+        f'<td class="tdata__td3"><a href="/Artist-{i % 97}/">Artist {i % 97}</a></td>'
+        f'<td class="tdata__td4">{1960 + i % 60}</td>'
+        f'<td class="tdata__td5"><span class="genre">Hip-Hop / Rap / R&amp;B</span></td></tr>'
+        for i in range(count)
+    )
+
+
+def _page(body: str) -> str:
+    # Navigation, scripts and comment blocks make up most of a real page's weight
+    chrome = "".join(
+        f'<li class="nav-item"><a href="/genre/{i}/">Genre {i}</a></li>' for i in range(400)
+    )
+    scripts = "".join(f"<script>window.__data{i} = {{'k': {i}, 'v': '{'x' * 200}'}};</script>" for i in range(150))
+    comments = "".join(
+        f'<div class="comment"><p class="user">user{i}</p><p>{"Great flip of this record! " * 8}</p></div>'
+        for i in range(300)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>WhoSampled</title>"
+        f"{scripts}</head><body><nav><ul>{chrome}</ul></nav>"
+        f'<div id="content">{body}</div><div class="comments">{comments}</div></body></html>'
+    )
+
+
+def _section(header: str, rows: str) -> str:
+    return (
+        f'<section class="subsection"><header><h3 class="section-header-title">{header}</h3></header>'
+        f'<table class="tdata"><thead><tr><th>Track</th></tr></thead><tbody>{rows}</tbody></table></section>'
+    )
+
+
+def synthetic_pages() -> dict:
+    main = _page(
+        _section("Contains samples of 12 songs", _rows(3, "Sample"))
+        + _section("Was sampled in 480 songs", _rows(3, "Sampled"))
+        + _section("Was covered in 25 songs", _rows(3, "Cover"))
+        + _section("Was remixed in 9 songs", _rows(3, "Remix"))
+    )
+    # Large "sampled in" list pages repeat entries across sub-tables, which dedupe removes
+    sampled_list = _page(_section("Sampled in", _rows(480, "Sampled") + _rows(120, "Sampled")))
+    samples_list = _page(_section("Contains samples of", _rows(12, "Sample")))
+    return {"main (synthetic)": main, "sampled list (synthetic)": sampled_list, "samples list (synthetic)": samples_list}
+
+
+def saved_pages(paths) -> dict:
+    pages = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def time_parse(parse, html: str) -> float:
+    """Best-of-RUNS parse time in milliseconds"""
+    best = float("inf")
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        parse(html)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    if not whosampled.LXML_AVAILABLE:
+        sys.exit("lxml is not installed - nothing to compare against")
+
+    pages = saved_pages(sys.argv[1:]) if len(sys.argv) > 1 else synthetic_pages()
+    print(f"{'page':<28} {'KB':>7} {'rows':>6} {'bs4 ms':>9} {'lxml ms':>9} {'speedup':>8}")
+    for name, html in pages.items():
+        parse = whosampled.parse_main_page if "main" in name else whosampled.parse_list_page
+
+        whosampled.LXML_AVAILABLE = False
+        soup_result = parse(html)
+        soup_ms = time_parse(parse, html)
+        whosampled.LXML_AVAILABLE = True
+        lxml_result = parse(html)
+        lxml_ms = time_parse(parse, html)
+
+        if soup_result != lxml_result:
+            sys.exit(f"{name}: lxml and BeautifulSoup results differ")
+        rows = len(lxml_result) if isinstance(lxml_result, list) else (
+            len(lxml_result["samples"]) + len(lxml_result["sampled_by"])
+        )
+        print(f"{name:<28} {len(html) / 1024:>7.0f} {rows:>6} {soup_ms:>9.1f} {lxml_ms:>9.1f} {soup_ms / lxml_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
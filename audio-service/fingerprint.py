@@ -0,0 +1,116 @@
+import io
+import subprocess
+import wave
+from typing import Optional
+
+import numpy as np
+
+from stages import remaining
+
+# Fingerprints are computed on 8 kHz mono audio: enough bandwidth for landmarks, cheap to FFT
+SAMPLE_RATE = 8000
+FFT_SIZE = 1024
+HOP_SIZE = 256
+# Neighbourhood a spectrogram peak must dominate (frequency bins, frames)
+PEAK_FREQ_RADIUS = 15
+PEAK_TIME_RADIUS = 8
+# Only the strongest peaks in each second are kept, so added noise can't flood the landmarks
+PEAKS_PER_SECOND = 15
+# Each anchor peak is paired with this many later peaks inside the target zone
+FAN_OUT = 5
+MAX_DT = 63  # frames (~2 s), fits in 6 bits
+MAX_DF = 127  # frequency bins
+# Hashes pack f1 (9 bits), f2 (9 bits) and dt (6 bits)
+FREQ_BITS = 9
+DT_BITS = 6
+
+
+def decode_pcm(audio_data: bytes, max_seconds: Optional[float] = None, deadline: Optional[float] = None) -> np.ndarray:
+    """Decode any audio buffer to float32 mono samples at SAMPLE_RATE.
+    16-bit PCM WAVs at a multiple of SAMPLE_RATE are decoded in-process, everything else through ffmpeg."""
+    if audio_data[:4] == b"RIFF":
+        try:
+            return _decode_wav(audio_data, max_seconds)
+        except (wave.Error, ValueError):
+            pass
+
+    command = ['ffmpeg', '-loglevel', 'error', '-i', 'pipe:0']
+    if max_seconds:
+        command += ['-t', f"{max_seconds:.2f}"]
+    command += ['-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le', 'pipe:1']
+    try:
+        result = subprocess.run(command, input=audio_data, check=True, capture_output=True,
+                                timeout=remaining(deadline))
+    except subprocess.TimeoutExpired:
+        raise TimeoutError("ffmpeg killed at the job deadline") from None
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def _decode_wav(audio_data: bytes, max_seconds: Optional[float]) -> np.ndarray:
+    with wave.open(io.BytesIO(audio_data)) as wav:
+        rate, channels = wav.getframerate(), wav.getnchannels()
+        if wav.getsampwidth() != 2 or rate % SAMPLE_RATE:
+            raise ValueError("needs resampling")
+        frames = wav.getnframes() if not max_seconds else min(wav.getnframes(), int(max_seconds * rate))
+        samples = np.frombuffer(wav.readframes(frames), dtype="<i2").astype(np.float32) / 32768
+    samples = samples[: len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    # Average down to SAMPLE_RATE (a crude low-pass, fine for landmark peaks)
+    factor = rate // SAMPLE_RATE
+    samples = samples[: len(samples) - len(samples) % factor]
+    return samples.reshape(-1, factor).mean(axis=1)
+
+
+def spectrogram(samples: np.ndarray) -> np.ndarray:
+    """Log-magnitude spectrogram, shape (frames, FFT_SIZE // 2)"""
+    if len(samples) < FFT_SIZE:
+        return np.zeros((0, FFT_SIZE // 2), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FFT_SIZE), axis=1))[:, : FFT_SIZE // 2]
+    return np.log1p(spectrum * 1000).astype(np.float32)
+
+
+def _max_filter(values: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    padded = np.pad(values, [(radius, radius) if a == axis else (0, 0) for a in range(values.ndim)],
+                    constant_values=-np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1, axis=axis)
+    return windows.max(axis=-1)
+
+
+def find_peaks(spec: np.ndarray) -> np.ndarray:
+    """(frame, bin) of the strongest local maxima per second of spectrogram, sorted by frame"""
+    if spec.size == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    neighbourhood = _max_filter(_max_filter(spec, PEAK_FREQ_RADIUS, axis=1), PEAK_TIME_RADIUS, axis=0)
+    peaks = np.argwhere((spec == neighbourhood) & (spec > spec.mean()))
+    # Rank peaks by strength within each one-second block and keep the top PEAKS_PER_SECOND
+    blocks = peaks[:, 0] // (SAMPLE_RATE // HOP_SIZE)
+    order = np.lexsort((-spec[peaks[:, 0], peaks[:, 1]], blocks))
+    peaks, blocks = peaks[order], blocks[order]
+    rank = np.arange(len(peaks)) - np.searchsorted(blocks, blocks)
+    peaks = peaks[rank < PEAKS_PER_SECOND]
+    return peaks[np.lexsort((peaks[:, 1], peaks[:, 0]))]
+
+
+def landmarks(samples: np.ndarray):
+    """Landmark hashes and their anchor frames for a clip: (hashes uint32[], times uint32[])"""
+    peaks = find_peaks(spectrogram(samples))
+    if len(peaks) < 2:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32)
+    frames, bins = peaks[:, 0], peaks[:, 1]
+    anchors = np.arange(len(peaks))
+    # Pair every anchor with each of the next `span` peaks at once: column k is peak anchor + k + 1
+    span = int((np.searchsorted(frames, frames + MAX_DT, side="right") - anchors).max()) - 1
+    if span < 1:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32)
+    targets = anchors[:, None] + np.arange(1, span + 1)
+    in_range = targets < len(peaks)
+    targets = np.minimum(targets, len(peaks) - 1)
+    dt = frames[targets] - frames[:, None]
+    df = bins[targets] - bins[:, None]
+    valid = in_range & (dt > 0) & (dt <= MAX_DT) & (np.abs(df) <= MAX_DF)
+    # Keep each anchor's first FAN_OUT valid targets, nearest first
+    valid &= np.cumsum(valid, axis=1) <= FAN_OUT
+
+    rows, cols = np.nonzero(valid)
+    hashes = (bins[rows] << (FREQ_BITS + DT_BITS)) | (bins[targets[rows, cols]] << DT_BITS) | dt[rows, cols]
+    return hashes.astype(np.uint32), frames[rows].astype(np.uint32)
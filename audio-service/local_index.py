@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from fingerprint import landmarks
+
+# Directory holding the memory-mapped landmark table and its track metadata
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/fingerprints")
+# Hash table slots (rounded up to a power of two); 12 bytes each on disk
+LOCAL_INDEX_SLOTS = int(os.getenv("LOCAL_INDEX_SLOTS", str(1 << 22)))
+# Minimum time-aligned landmark matches for a local answer, and how far it must beat the runner-up
+LOCAL_MATCH_MIN_HITS = int(os.getenv("LOCAL_MATCH_MIN_HITS", "20"))
+LOCAL_MATCH_MIN_MARGIN = float(os.getenv("LOCAL_MATCH_MIN_MARGIN", "2.0"))
+# Different clips indexed per track - more clips cover more of the song
+MAX_CLIPS_PER_TRACK = int(os.getenv("LOCAL_INDEX_MAX_CLIPS_PER_TRACK", "8"))
+# Stop adding once the table is this full; linear probing degrades past it
+MAX_LOAD = 0.7
+
+# key is the landmark hash + 1 so that 0 marks an empty slot
+ENTRY = np.dtype([("key", "<u4"), ("track", "<u4"), ("time", "<u4")])
+
+
+class FingerprintIndex:
+    """Local landmark fingerprint index, queried before ACRCloud.
+
+    Landmarks from every clip ACRCloud identifies go into an open-addressing hash
+    table in a memory-mapped file (hash -> track id, anchor frame). A query looks
+    up its own landmarks and counts, per track, how many agree on one time offset
+    into the indexed clip; a track with enough aligned hits is a match."""
+
+    def __init__(self, directory: str = LOCAL_INDEX_DIR, slots: int = LOCAL_INDEX_SLOTS):
+        os.makedirs(directory, exist_ok=True)
+        table_path = os.path.join(directory, "landmarks.bin")
+        if os.path.exists(table_path):
+            self.table = np.memmap(table_path, dtype=ENTRY, mode="r+")
+        else:
+            self.table = np.memmap(table_path, dtype=ENTRY, mode="w+", shape=(1 << max(1, slots - 1).bit_length(),))
+        self.slots = len(self.table)
+        self.bits = self.slots.bit_length() - 1
+        self.used = int(np.count_nonzero(self.table["key"]))
+        self.db_path = os.path.join(directory, "tracks.db")
+        self.local_hits = 0
+        self.local_misses = 0
+        self._write_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS tracks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT UNIQUE NOT NULL,
+                    track_info TEXT NOT NULL
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS clips (
+                    digest TEXT PRIMARY KEY,
+                    track_id INTEGER NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _home_slots(self, keys: np.ndarray) -> np.ndarray:
+        # Multiplicative hashing spreads the packed landmark bits over the whole table
+        mixed = (keys.astype(np.uint64) * np.uint64(2654435761)) & np.uint64(0xFFFFFFFF)
+        return (mixed >> np.uint64(32 - self.bits)).astype(np.int64)
+
+    @staticmethod
+    def track_key(track_info: dict) -> str:
+        if track_info.get("isrc"):
+            return f"isrc:{track_info['isrc']}"
+        return f"{track_info.get('title')}|{track_info.get('artist')}".lower()
+
+    def add(self, track_info: dict, samples: np.ndarray) -> bool:
+        """Index a clip identified as track_info; returns False if it was skipped"""
+        hashes, times = landmarks(samples)
+        if not len(hashes):
+            return False
+        digest = hashlib.sha1(hashes.tobytes() + times.tobytes()).hexdigest()
+
+        with self._write_lock, self._connect() as conn:
+            if conn.execute("SELECT 1 FROM clips WHERE digest = ?", (digest,)).fetchone():
+                return False
+            key = self.track_key(track_info)
+            conn.execute(
+                "INSERT INTO tracks (key, track_info) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET track_info = excluded.track_info",
+                (key, json.dumps(track_info)),
+            )
+            track_id = conn.execute("SELECT id FROM tracks WHERE key = ?", (key,)).fetchone()[0]
+            clips = conn.execute("SELECT COUNT(*) FROM clips WHERE track_id = ?", (track_id,)).fetchone()[0]
+            if clips >= MAX_CLIPS_PER_TRACK:
+                return False
+            if self.used + len(hashes) > MAX_LOAD * self.slots:
+                print(f"[LocalIndex] Index full ({self.used}/{self.slots} slots), not adding more clips", flush=True)
+                return False
+
+            keys = hashes + 1
+            mask = self.slots - 1
+            for entry_key, time, slot in zip(keys.tolist(), times.tolist(), self._home_slots(hashes).tolist()):
+                while self.table["key"][slot]:
+                    slot = (slot + 1) & mask
+                # Key last, so a concurrent reader never sees a key with stale fields
+                self.table["track"][slot] = track_id
+                self.table["time"][slot] = time
+                self.table["key"][slot] = entry_key
+            self.used += len(keys)
+            self.table.flush()
+            conn.execute("INSERT INTO clips (digest, track_id) VALUES (?, ?)", (digest, track_id))
+        return True
+
+    def match(self, samples: np.ndarray) -> Optional[Tuple[dict, int]]:
+        """(track_info, aligned hits) for a confident local match, else None"""
+        hashes, times = landmarks(samples)
+        if not len(hashes):
+            self.local_misses += 1
+            return None
+
+        keys = hashes + 1
+        positions = self._home_slots(hashes)
+        query_times = times.astype(np.int64)
+        active = np.arange(len(keys))
+        found_tracks = []
+        found_offsets = []
+        mask = self.slots - 1
+        # Probe every query hash in lockstep until each reaches an empty slot
+        while len(active):
+            entries = self.table[positions[active]]
+            occupied = entries["key"] != 0
+            hit = occupied & (entries["key"] == keys[active])
+            found_tracks.append(entries["track"][hit].astype(np.int64))
+            found_offsets.append(entries["time"][hit].astype(np.int64) - query_times[active][hit])
+            active = active[occupied]
+            positions[active] = (positions[active] + 1) & mask
+
+        tracks = np.concatenate(found_tracks)
+        if not len(tracks):
+            self.local_misses += 1
+            return None
+        offsets = np.concatenate(found_offsets)
+        # Votes per (track, offset): a true match lines up at a single offset
+        pairs, counts = np.unique(np.stack([tracks, offsets], axis=1), axis=0, return_counts=True)
+        best = int(np.argmax(counts))
+        best_track, best_hits = int(pairs[best][0]), int(counts[best])
+        others = counts[pairs[:, 0] != best_track]
+        runner_up = int(others.max()) if len(others) else 0
+
+        if best_hits < LOCAL_MATCH_MIN_HITS or best_hits < LOCAL_MATCH_MIN_MARGIN * runner_up:
+            self.local_misses += 1
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT track_info FROM tracks WHERE id = ?", (best_track,)).fetchone()
+        if row is None:
+            self.local_misses += 1
+            return None
+        self.local_hits += 1
+        return json.loads(row[0]), best_hits
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            tracks = conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+        return {
+            "tracks": tracks,
+            "slots": self.slots,
+            "used": self.used,
+            "local_hits": self.local_hits,
+            "local_misses": self.local_misses,
+        }
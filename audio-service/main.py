@@ -1,18 +1,41 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from urllib.parse import urlparse, parse_qs
-import yt_dlp
+from typing import List, Optional
+import asyncio
+import hashlib
+import json
+import subprocess
+import re
 import tempfile
 import os
-from acrcloud.recognizer import ACRCloudRecognizer
-import json
-
-from whosampled import search_whosampled
-
 
 load_dotenv()
 
+from whosampled import search_whosampled, close_client, session_pool, whosampled_cache
+from recognition import recognize_buffer, extract_track_info
+from stages import (
+    StageFull, download_stage, transcode_stage, recognize_stage, fingerprint_stage, stage_stats, shutdown_stages,
+    job_deadline
+)
+from youtube_audio import (
+    CLIP_SECONDS, YOUTUBE_PIPED, download_audio, transcode_to_mp3, resolve_stream, stream_to_mp3,
+    stream_to_mp3_bytes, clip_offset, extract_clip, extract_snippet
+)
+from result_cache import ResultCache
+from audio_cache import AudioCache
+from range_response import range_file_response
+from upload_audio import (
+    MAX_UPLOAD_BYTES, MAX_BATCH_UPLOAD_BYTES, MULTIPART_OVERHEAD_BYTES, UPLOAD_CLIP_SECONDS, UploadTooLarge,
+    UploadLimitMiddleware, decode_upload_clip
+)
+from fingerprint import SAMPLE_RATE, decode_pcm
+from local_index import FingerprintIndex
+from window_selection import best_windows
+
 
 def clean_youtube_url(url: str) -> str:
     """Strip playlist and other parameters, keep only video ID"""
@@ -27,7 +50,47 @@ def clean_youtube_url(url: str) -> str:
         return f"https://www.youtube.com/watch?v={video_id}"
     
     return url
-app = FastAPI()
+
+
+def youtube_video_id(url: str) -> Optional[str]:
+    """Video ID of a cleaned YouTube URL, or None if it isn't a watch URL"""
+    params = parse_qs(urlparse(url).query)
+    return params['v'][0] if 'v' in params else None
+
+
+# YouTube video IDs are 11 URL-safe base64 characters
+YOUTUBE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+# Longest Heardle snippet we'll cut
+MAX_SNIPPET_SECONDS = int(os.getenv("MAX_SNIPPET_SECONDS", "60"))
+# Longest window clip-mode recognition will decode
+MAX_CLIP_SECONDS = float(os.getenv("MAX_CLIP_SECONDS", "30"))
+# How much of a buffer is analysed for recognition windows and goes into the local fingerprint index
+LOCAL_INDEX_SECONDS = float(os.getenv("LOCAL_INDEX_SECONDS", "60"))
+# Most items one /recognize/batch request may carry, and how many run at once by default
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shutdown_stages()
+    await close_client()
+
+
+app = FastAPI(lifespan=lifespan)
+result_cache = ResultCache()
+audio_cache = AudioCache()
+local_index = FingerprintIndex()
+# Background index inserts, referenced until they finish
+index_tasks = set()
+
+# Refuse oversized uploads before Starlette spools them to disk (added first so CORS wraps its 413s)
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/recognize/file": MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/recognize/batch": MAX_BATCH_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+})
 
 # emable CORS
 app.add_middleware(
@@ -37,175 +100,381 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# configure acrcloud recognizer
-config = {
-    "host": os.getenv("ACR_HOST"),
-    "access_key": os.getenv("ACR_ACCESS_KEY"),
-    "access_secret": os.getenv("ACR_ACCESS_SECRET"),
-    "timeout": 10,
-}
-recognizer = ACRCloudRecognizer(config)
-
-
 
 @app.get("/health")
 def health_check():
-    return {"message": "ok", "service": "audio-service"}
+    return {
+        "message": "ok",
+        "service": "audio-service",
+        "stages": stage_stats(),
+        "result_cache": result_cache.stats(),
+        "audio_cache": audio_cache.stats(),
+        "local_index": local_index.stats(),
+        "flaresolverr_sessions": session_pool.stats(),
+        "whosampled_cache": whosampled_cache.stats(),
+    }
 
 
-@app.post("/recognize/youtube")
-async def recognize_from_youtube(url: str):
-    """Recognize audio from YouTube URL"""
+def job_error(e: Exception) -> HTTPException:
+    """HTTP error for a failed job: 503 when a stage is saturated, 504 past the deadline"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, UploadTooLarge):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, StageFull):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    if isinstance(e, TimeoutError):
+        return HTTPException(status_code=504, detail=str(e) or "Job deadline exceeded")
+    return HTTPException(status_code=500, detail=str(e))
+
+
+async def fetch_youtube_mp3(url: str, temp_dir: str, deadline: float) -> str:
+    """Transcode a YouTube video's audio to an MP3 in temp_dir on the pipeline stages.
+    Piped mode has ffmpeg read the stream directly; otherwise the source is downloaded first."""
+    if YOUTUBE_PIPED:
+        stream = await download_stage.run(resolve_stream, url, deadline, deadline=deadline)
+        return await transcode_stage.run(stream_to_mp3, stream, temp_dir, deadline, deadline=deadline)
+    source_file = await download_stage.run(download_audio, url, temp_dir, deadline, deadline=deadline)
+    return await transcode_stage.run(transcode_to_mp3, source_file, temp_dir, deadline, deadline=deadline)
+
+
+async def fetch_youtube_mp3_bytes(url: str, deadline: float) -> bytes:
+    """A YouTube video's audio as an in-memory MP3; in piped mode nothing touches disk"""
+    if YOUTUBE_PIPED:
+        stream = await download_stage.run(resolve_stream, url, deadline, deadline=deadline)
+        return await transcode_stage.run(stream_to_mp3_bytes, stream, deadline, deadline=deadline)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        audio_file = await fetch_youtube_mp3(url, temp_dir, deadline)
+        
+        with open(audio_file, 'rb') as f:
+            return f.read()
+
+
+async def fetch_youtube_clip(url: str, offset: Optional[float], duration: float, deadline: float) -> bytes:
+    """Decode just a short window of a YouTube video's audio into a WAV buffer.
+    offset=None takes the window from the middle of the track."""
+    stream = await download_stage.run(resolve_stream, url, deadline, deadline=deadline)
+    if offset is None:
+        offset = clip_offset(stream["duration"], duration)
+    return await transcode_stage.run(extract_clip, stream, offset, duration, deadline, deadline=deadline)
+
+
+def analyse(audio_data: bytes, deadline: float):
+    """Decode a buffer, pick its most musical windows and look the best one up in the local index.
+    Returns (samples, window start seconds best first, (track_info, hits) or None)"""
+    samples = decode_pcm(audio_data, LOCAL_INDEX_SECONDS, deadline)
+    windows = best_windows(samples)
+    start = windows[0] * SAMPLE_RATE
+    return samples, windows, local_index.match(samples[start: start + int(CLIP_SECONDS * SAMPLE_RATE)])
+
+
+async def index_clip(track_info: dict, samples):
+    try:
+        if await fingerprint_stage.run(local_index.add, track_info, samples):
+            print(f"[Main] Indexed {track_info['title']} locally", flush=True)
+    except Exception as e:
+        print(f"[Main] Local index error (non-fatal): {type(e).__name__}: {str(e)}", flush=True)
+
+
+async def recognize_windows(audio_data: bytes, windows: List[int], deadline: float) -> Optional[dict]:
+    """Send each window of audio_data to ACRCloud concurrently and vote on the answers.
+    A track matched by a majority of windows wins straight away (windows still queued are dropped,
+    running ones finish on their stage and are ignored); otherwise the best-scoring single match
+    does. Errors only surface if every window failed."""
+    tasks = [
+        asyncio.create_task(recognize_stage.run(recognize_buffer, audio_data, start, deadline=deadline))
+        for start in windows
+    ]
+    majority = len(windows) // 2 + 1
+    votes = {}
+    matches = []
+    errors = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                track_info = extract_track_info(await next_done)
+            except Exception as e:
+                errors.append(e)
+                continue
+            if not track_info:
+                continue
+            key = FingerprintIndex.track_key(track_info)
+            votes[key] = votes.get(key, 0) + 1
+            matches.append(track_info)
+            if votes[key] >= majority:
+                print(f"[Main] ACRCloud vote: {track_info['title']} ({votes[key]}/{len(windows)} windows)", flush=True)
+                return track_info
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if not matches:
+        if errors and len(errors) == len(windows):
+            raise errors[0]
+        return None
+    # No majority: most votes, then ACRCloud's own score
+    return max(matches, key=lambda info: (votes[FingerprintIndex.track_key(info)], info.get('score') or 0))
+
+
+async def identify(audio_data: bytes, deadline: float) -> Optional[dict]:
+    """Track info for an audio buffer, or None.
+    The local fingerprint index answers first; on a local miss the most musical windows
+    go to ACRCloud, and every ACRCloud match is added to the index for next time."""
+    samples = None
+    windows = [0]
+    try:
+        samples, windows, match = await fingerprint_stage.run(analyse, audio_data, deadline, deadline=deadline)
+    except TimeoutError:
+        # A subclass of OSError - past the deadline there's no time left for ACRCloud either
+        raise
+    except (StageFull, subprocess.CalledProcessError, OSError, ValueError) as e:
+        # Analysis is an optimisation - anything short of the deadline falls through to ACRCloud from the start
+        print(f"[Main] Local lookup skipped: {type(e).__name__}: {str(e)}", flush=True)
+        match = None
+    if match:
+        track_info, hits = match
+        print(f"[Main] Local match: {track_info['title']} ({hits} aligned landmarks)", flush=True)
+        return track_info
+
+    # Send to ACRCloud
+    track_info = await recognize_windows(audio_data, windows, deadline)
+    if track_info and samples is not None and len(samples):
+        task = asyncio.create_task(index_clip(track_info, samples))
+        index_tasks.add(task)
+        task.add_done_callback(index_tasks.discard)
+    return track_info
+
+
+async def recognized_response(track_info: dict) -> dict:
+    """Successful recognition response: the track plus its WhoSampled samples.
+    Samples always come through search_whosampled, whose cache keeps failed lookups only briefly."""
+    # Get sample information from WhoSampled (optional - gracefully handle if FlareSolverr not available)
+    try:
+        sample_data = await search_whosampled(track_info['title'], track_info['artist'])
+        print(f"[Main] WhoSampled result: {len(sample_data.get('samples', []))} samples, {len(sample_data.get('sampled_by', []))} sampled_by", flush=True)
+    except Exception as e:
+        print(f"[Main] WhoSampled error (non-fatal): {type(e).__name__}: {str(e)}", flush=True)
+        sample_data = {"sampled_by": [], "samples": []}
+    
+    return {
+        "success": True,
+        "track": track_info,
+        "samples": sample_data
+    }
+
+
+async def recognize_youtube(url: str, mode: str, offset: Optional[float], duration: float) -> dict:
+    """Recognition response for a YouTube URL, served from the result cache when possible"""
     url = clean_youtube_url(url)
+    video_id = youtube_video_id(url)
+    cache_key = None
+    if video_id:
+        # An explicit clip offset may land on a different song (long mixes), so it gets its own entry
+        cache_key = f"youtube:{video_id}"
+        if mode == "clip" and offset is not None:
+            cache_key += f"@{offset:g}+{duration:g}"
+    if cache_key:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            print(f"[Main] Cached result for video {video_id}", flush=True)
+            return await recognized_response(cached["track"])
+    deadline = job_deadline()
+    if mode == "clip":
+        audio_data = await fetch_youtube_clip(url, offset, duration, deadline)
+    else:
+        audio_data = await fetch_youtube_mp3_bytes(url, deadline)
+    
+    track_info = await identify(audio_data, deadline)
+    
+    if track_info:
+        # Only matches are cached - a miss may succeed with a different window
+        if cache_key:
+            result_cache.put(cache_key, {"track": track_info})
+        return await recognized_response(track_info)
+    else:
+        return {"success": False, "message": "Song not recognized"}
+
+
+async def recognize_upload(file: UploadFile) -> dict:
+    """Recognition response for an uploaded audio file, served from the result cache when possible.
+    Only the first UPLOAD_CLIP_SECONDS are decoded, streamed through ffmpeg, so memory doesn't grow with the upload."""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    deadline = job_deadline()
     try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            audio_template = os.path.join(temp_dir, 'audio.%(ext)s')
-            
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': audio_template,
-                'quiet': True,
-                'no_warnings': True,
-                'noplaylist': True,
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                }]
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            
-            audio_file = os.path.join(temp_dir, 'audio.mp3')
-            
-            if not os.path.exists(audio_file):
-                raise HTTPException(status_code=500, detail="Audio file not found")
-            
-            with open(audio_file, 'rb') as f:
-                audio_data = f.read()
-            
-            # Send to ACRCloud
-            result = recognizer.recognize_by_filebuffer(audio_data, 0)
-            result_dict = json.loads(result)
-            
-            if result_dict['status']['code'] == 0:
-                music = result_dict['metadata']['music'][0]
-                track_info = {
-                    "title": music.get('title'),
-                    "artist": music['artists'][0]['name'] if music.get('artists') else None,
-                    "album": music.get('album', {}).get('name'),
-                    "release_date": music.get('release_date'),
-                    "duration": music.get('duration_ms'),
-                    "score": music.get('score', 100),
-                    "spotify_id": music.get('external_metadata', {}).get('spotify', {}).get('track', {}).get('id'),
-                    "isrc": music.get('external_ids', {}).get('isrc')
-                }
-                
-                # Get sample information from WhoSampled (optional - gracefully handle if FlareSolverr not available)
-                try:
-                    sample_data = await search_whosampled(track_info['title'], track_info['artist'])
-                    print(f"[Main] WhoSampled result: {len(sample_data.get('samples', []))} samples, {len(sample_data.get('sampled_by', []))} sampled_by", flush=True)
-                except Exception as e:
-                    print(f"[Main] WhoSampled error (non-fatal): {type(e).__name__}: {str(e)}", flush=True)
-                    sample_data = {"sampled_by": [], "samples": []}
-                
-                return {
-                    "success": True,
-                    "track": track_info,
-                    "samples": sample_data
-                }
-            else:
-                return {"success": False, "message": "Song not recognized"}
-                
+        clip = await transcode_stage.run(decode_upload_clip, file.file, MAX_UPLOAD_BYTES, UPLOAD_CLIP_SECONDS,
+                                         deadline, deadline=deadline)
+    except (subprocess.CalledProcessError, ValueError):
+        raise HTTPException(status_code=400, detail="Could not decode the uploaded audio")
+    # The decoded clip identifies the upload without hashing the whole file
+    cache_key = f"file:{hashlib.sha256(clip).hexdigest()}"
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        print(f"[Main] Cached result for upload {cache_key[5:17]}", flush=True)
+        return await recognized_response(cached["track"])
+    
+    ## local fingerprint index first, then acrcloud on the most musical windows
+    track_info = await identify(clip, deadline)
+    
+    ## check if we got a match
+    if track_info:
+        result_cache.put(cache_key, {"track": track_info})
+        return await recognized_response(track_info)
+    else:
+        return {"success": False, "message": "Song not recognized"}
+
+
+@app.post("/recognize/youtube")
+async def recognize_from_youtube(url: str, mode: str = "clip", offset: Optional[float] = None,
+                                 duration: float = CLIP_SECONDS):
+    """Recognize audio from YouTube URL.
+    mode="clip" (default) fetches and decodes only `duration` seconds starting at
+    `offset` (middle of the track if omitted); mode="full" downloads the whole track."""
+    if mode not in ("clip", "full"):
+        raise HTTPException(status_code=400, detail="mode must be 'clip' or 'full'")
+    if (offset is not None and offset < 0) or not 0 < duration <= MAX_CLIP_SECONDS:
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and duration > 0 and at most {MAX_CLIP_SECONDS:g}")
+    try:
+        return await recognize_youtube(url, mode, offset, duration)
     except Exception as e:
         print(f"[Main] Error: {e}", flush=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise job_error(e)
 
 
 @app.post("/recognize/file")
 async def recognize_audio_file(file: UploadFile = File(...)):
     try:
-        ## recognize audio from uploaded file content
-        content = await file.read()
-        
-        ## send to acrcloud recognizer (start_seconds=0 means start from beginning)
-        result = recognizer.recognize_by_filebuffer(content, 0)
-        resultdict = json.loads(result)
-        
-        ## check if we got a match
-        if resultdict["status"]["code"] == 0:
-            music = resultdict["metadata"]["music"][0]
-            track_info = {
-                "title": music.get('title'),
-                "artist": music['artists'][0]['name'] if music.get('artists') else None,
-                "album": music.get('album', {}).get('name'),
-                "release_date": music.get('release_date'),
-                "duration": music.get('duration_ms'),
-                "score": music.get('score', 100),
-                "spotify_id": music.get('external_metadata', {}).get('spotify', {}).get('track', {}).get('id'),
-                "isrc": music.get('external_ids', {}).get('isrc')
-            }
-            
-            # Get sample information from WhoSampled (optional - gracefully handle if FlareSolverr not available)
+        return await recognize_upload(file)
+    except Exception as e:
+        print(f"[Main] Error: {e}", flush=True)
+        raise job_error(e)
+
+
+@app.post("/recognize/batch")
+async def recognize_batch(urls: List[str] = Form([]), files: List[UploadFile] = File([]),
+                          mode: str = "clip", concurrency: int = BATCH_CONCURRENCY):
+    """Recognize many YouTube URLs and/or uploaded files (multipart form, repeated `urls` / `files` fields).
+    Items run `concurrency` at a time and each result is streamed as one NDJSON line as soon as it
+    finishes, tagged with the item's `index` (URLs first, then files) and `input`. A video that
+    appears more than once in the batch is recognized once and reported for every occurrence."""
+    if mode not in ("clip", "full"):
+        raise HTTPException(status_code=400, detail="mode must be 'clip' or 'full'")
+    if not urls and not files:
+        raise HTTPException(status_code=400, detail="Provide at least one url or file")
+    if len(urls) + len(files) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch holds at most {BATCH_MAX_ITEMS} items")
+    if not 1 <= concurrency <= BATCH_MAX_CONCURRENCY:
+        raise HTTPException(status_code=400, detail=f"concurrency must be between 1 and {BATCH_MAX_CONCURRENCY}")
+
+    # One job per distinct video (or file), remembering every batch position it answers
+    jobs = {}
+    occurrences = {}
+    for index, url in enumerate(urls):
+        cleaned = clean_youtube_url(url)
+        key = youtube_video_id(cleaned) or cleaned
+        if key not in jobs:
+            jobs[key] = lambda url=url: recognize_youtube(url, mode, None, CLIP_SECONDS)
+        occurrences.setdefault(key, []).append((index, url))
+    for index, file in enumerate(files, start=len(urls)):
+        key = f"file:{index}"
+        jobs[key] = lambda file=file: recognize_upload(file)
+        occurrences[key] = [(index, file.filename)]
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(key: str):
+        async with semaphore:
             try:
-                sample_data = await search_whosampled(track_info['title'], track_info['artist'])
-                print(f"[Main] WhoSampled result: {len(sample_data.get('samples', []))} samples, {len(sample_data.get('sampled_by', []))} sampled_by", flush=True)
+                return key, await jobs[key](), None
             except Exception as e:
-                print(f"[Main] WhoSampled error (non-fatal): {type(e).__name__}: {str(e)}", flush=True)
-                sample_data = {"sampled_by": [], "samples": []}
-            
-            return {
-                "success": True,
-                "track": track_info,
-                "samples": sample_data
-            }
-        else:
-            return {"success": False, "message": "Song not recognized"}
+                print(f"[Main] Batch item error: {type(e).__name__}: {str(e)}", flush=True)
+                return key, None, job_error(e)
 
-    except Exception as e:
-        print(f"[Main] Error: {e}", flush=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    async def records():
+        tasks = [asyncio.create_task(run(key)) for key in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                key, response, error = await next_done
+                if error is not None:
+                    response = {"success": False, "status": error.status_code, "message": error.detail}
+                for index, item in occurrences[key]:
+                    yield json.dumps({"index": index, "input": item, **response}) + "\n"
+        finally:
+            # Finished, or the client went away - don't leave items running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(records(), media_type="application/x-ndjson")
 
 
 @app.get("/youtube/audio/{youtube_id}")
-async def get_youtube_audio(youtube_id: str):
-    """Extract and stream audio from YouTube video"""
+async def get_youtube_audio(youtube_id: str, request: Request):
+    """Extract and stream audio from YouTube video (cached on disk, supports Range requests)"""
+    if not YOUTUBE_ID_RE.match(youtube_id):
+        raise HTTPException(status_code=400, detail="Invalid YouTube video ID")
     try:
         url = f"https://www.youtube.com/watch?v={youtube_id}"
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            audio_template = os.path.join(temp_dir, 'audio.%(ext)s')
-            
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': audio_template,
-                'quiet': True,
-                'no_warnings': True,
-                'noplaylist': True,
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                }]
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            
-            audio_file = os.path.join(temp_dir, 'audio.mp3')
-            
-            if not os.path.exists(audio_file):
-                raise HTTPException(status_code=500, detail="Audio file not found")
-            
-            from fastapi.responses import FileResponse
-            return FileResponse(
-                audio_file,
-                media_type="audio/mpeg",
-                filename=f"{youtube_id}.mp3"
-            )
+        deadline = job_deadline()
+        audio_file = await audio_cache.get_or_fetch(
+            f"{youtube_id}.mp3", lambda temp_dir: fetch_youtube_mp3(url, temp_dir, deadline)
+        )
+        
+        return range_file_response(request, audio_file, media_type="audio/mpeg", filename=f"{youtube_id}.mp3")
             
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    
+        raise job_error(e)
+
+
+async def fetch_snippet(youtube_id: str, start: int, length: int, temp_dir: str) -> str:
+    """Cut a low-bitrate snippet of a YouTube video's audio on the pipeline stages"""
+    deadline = job_deadline()
+    url = f"https://www.youtube.com/watch?v={youtube_id}"
+    stream = await download_stage.run(resolve_stream, url, deadline, deadline=deadline)
+    return await transcode_stage.run(extract_snippet, stream, start, length, temp_dir, deadline, deadline=deadline)
+
+
+def snippet_key(youtube_id: str, start: int, length: int) -> str:
+    """Validate snippet parameters; returns the snippet's cache key"""
+    if not YOUTUBE_ID_RE.match(youtube_id):
+        raise HTTPException(status_code=400, detail="Invalid YouTube video ID")
+    if start < 0 or not 0 < length <= MAX_SNIPPET_SECONDS:
+        raise HTTPException(status_code=400, detail=f"start must be >= 0 and length between 1 and {MAX_SNIPPET_SECONDS}")
+    return f"{youtube_id}_{start}_{length}.mp3"
+
+
+@app.get("/youtube/snippet/{youtube_id}")
+async def get_youtube_snippet(youtube_id: str, request: Request, start: int = 0, length: int = 16):
+    """Stream a pre-trimmed, low-bitrate Heardle snippet: `length` seconds from `start`"""
+    key = snippet_key(youtube_id, start, length)
+    try:
+        snippet_file = await audio_cache.get_or_fetch(
+            key, lambda temp_dir: fetch_snippet(youtube_id, start, length, temp_dir)
+        )
+        return range_file_response(request, snippet_file, media_type="audio/mpeg", filename=key)
+    except Exception as e:
+        print(f"[Main] Snippet error: {e}", flush=True)
+        raise job_error(e)
+
+
+@app.post("/youtube/snippet/{youtube_id}", status_code=202)
+async def precompute_youtube_snippet(youtube_id: str, background_tasks: BackgroundTasks, start: int = 0,
+                                     length: int = 16):
+    """Cut and cache a snippet in the background so the first player doesn't wait for it"""
+    key = snippet_key(youtube_id, start, length)
+    if audio_cache.get(key) is None:
+        background_tasks.add_task(precompute_snippet, key, youtube_id, start, length)
+    return {"status": "accepted", "key": key}
+
+
+async def precompute_snippet(key: str, youtube_id: str, start: int, length: int):
+    try:
+        await audio_cache.get_or_fetch(key, lambda temp_dir: fetch_snippet(youtube_id, start, length, temp_dir))
+        print(f"[Main] Precomputed snippet {key}", flush=True)
+    except Exception as e:
+        print(f"[Main] Snippet precompute error (non-fatal): {type(e).__name__}: {str(e)}", flush=True)
+
+
 if __name__ == "__main__":
     import uvicorn
     import os
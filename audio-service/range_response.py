@@ -0,0 +1,95 @@
+import os
+import re
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(stat: os.stat_result) -> str:
+    # Size + inode: stable across hits (which bump mtime) and new whenever the file is replaced
+    return f'"{stat.st_size:x}-{stat.st_ino:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) for a single "bytes=" range, or None if unsatisfiable.
+    Raises ValueError for headers we don't handle (e.g. multiple ranges)."""
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError(f"Unsupported Range header: {header}")
+    if size == 0:
+        return None
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last N bytes
+        if not end or int(end) == 0:
+            return None
+        return max(0, size - int(end)), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return None
+    return start, end
+
+
+def _read_chunks(f: BinaryIO, start: int, length: int) -> Iterator[bytes]:
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def range_file_response(request: Request, path: str, media_type: str, filename: str) -> Response:
+    """Serve a file with ETag/If-None-Match and single-range Range/If-Range support"""
+    # Open before responding so the file stays readable even if it's evicted meanwhile
+    f = open(path, "rb")
+    stat = os.fstat(f.fileno())
+    size = stat.st_size
+    etag = file_etag(stat)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Cache-Control": "public, max-age=86400",
+        "Content-Disposition": f'inline; filename="{filename}"',
+    }
+
+    if request.headers.get("if-none-match") == etag:
+        f.close()
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    # If-Range: only honour the range if the client's copy is still current
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            # Servers may ignore a Range header they don't support and send the whole file
+            pass
+        else:
+            if byte_range is None:
+                f.close()
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            start, end = byte_range
+            length = end - start + 1
+            return StreamingResponse(
+                _read_chunks(f, start, length),
+                status_code=206,
+                media_type=media_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(length)},
+            )
+
+    return StreamingResponse(
+        _read_chunks(f, 0, size),
+        media_type=media_type,
+        headers={**headers, "Content-Length": str(size)},
+    )
@@ -0,0 +1,46 @@
+import json
+import os
+from typing import Optional
+
+from acrcloud.recognizer import ACRCloudRecognizer
+
+# configure acrcloud recognizer
+config = {
+    "host": os.getenv("ACR_HOST"),
+    "access_key": os.getenv("ACR_ACCESS_KEY"),
+    "access_secret": os.getenv("ACR_ACCESS_SECRET"),
+    "timeout": 10,
+}
+
+# One recognizer per process - recognition runs in the recognize stage's worker processes
+_recognizer: Optional[ACRCloudRecognizer] = None
+
+
+def get_recognizer() -> ACRCloudRecognizer:
+    global _recognizer
+    if _recognizer is None:
+        _recognizer = ACRCloudRecognizer(config)
+    return _recognizer
+
+
+def recognize_buffer(audio_data: bytes, start_seconds: int = 0) -> dict:
+    """Fingerprint audio_data and look it up on ACRCloud; returns the parsed response"""
+    result = get_recognizer().recognize_by_filebuffer(audio_data, start_seconds)
+    return json.loads(result)
+
+
+def extract_track_info(result_dict: dict) -> Optional[dict]:
+    """Track info for the best match in an ACRCloud response, or None if nothing matched"""
+    if result_dict['status']['code'] != 0:
+        return None
+    music = result_dict['metadata']['music'][0]
+    return {
+        "title": music.get('title'),
+        "artist": music['artists'][0]['name'] if music.get('artists') else None,
+        "album": music.get('album', {}).get('name'),
+        "release_date": music.get('release_date'),
+        "duration": music.get('duration_ms'),
+        "score": music.get('score', 100),
+        "spotify_id": music.get('external_metadata', {}).get('spotify', {}).get('track', {}).get('id'),
+        "isrc": music.get('external_ids', {}).get('isrc')
+    }
@@ -0,0 +1,76 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Optional
+
+# SQLite file holding recognition results, keyed by YouTube video ID or upload hash
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "data/recognition_cache.db")
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 86400)))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+
+
+class ResultCache:
+    """Persistent cache of recognition results ({"track": track_info}).
+
+    WhoSampled samples aren't stored here - they have their own cache with
+    shorter TTLs for failures. Entries expire after ttl_seconds; beyond
+    max_entries the least recently used rows are evicted."""
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+                 max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS recognition_results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM recognition_results WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE recognition_results SET last_used = ? WHERE key = ?", (now, key))
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO recognition_results (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl_seconds, now),
+            )
+            # Drop expired rows, then the least recently used beyond the cap
+            conn.execute("DELETE FROM recognition_results WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM recognition_results WHERE key NOT IN "
+                "(SELECT key FROM recognition_results ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM recognition_results").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight call.
+
+    The first caller for a key starts the work; callers arriving while it runs
+    get the same result (or exception) instead of starting their own. Once it
+    finishes the key is released, so the next call starts fresh."""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._in_flight
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> asyncio.Future:
+        """Join the call in flight for key, or start fn() as it, without waiting for the result"""
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._release(key, done))
+        return future
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        # Shielded so one caller giving up (a client disconnect, a deadline) doesn't cancel the work for the rest
+        return await asyncio.shield(self.start(key, fn))
+
+    def _release(self, key: Hashable, future: asyncio.Future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        # Mark the exception as retrieved even if every waiter has gone away
+        if not future.cancelled():
+            future.exception()
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# Wall-clock budget for one request's download/transcode/recognize jobs
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "90"))
+
+
+class StageFull(Exception):
+    """Raised instead of queueing when a stage's wait queue is already full"""
+
+
+def job_deadline(timeout: float = JOB_TIMEOUT_SECONDS) -> float:
+    """Absolute deadline (time.time()) for a job starting now"""
+    return time.time() + timeout
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left before deadline (None means no deadline); raises TimeoutError once it has passed"""
+    if deadline is None:
+        return None
+    left = deadline - time.time()
+    if left <= 0:
+        raise TimeoutError("Job deadline exceeded")
+    return left
+
+
+class Stage:
+    """A pipeline stage backed by its own bounded executor.
+
+    At most `workers` jobs run at once; up to `max_queue` more wait on the event
+    loop (not in the executor's queue) so they can be counted, time out, or be
+    dropped if the request is cancelled before they start. Beyond that, new
+    jobs are rejected straight away with StageFull."""
+
+    def __init__(self, name: str, workers: int, max_queue: int, processes: bool = False):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.processes = processes
+        self._executor: Optional[Executor] = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self.active = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._wait_ms = 0.0
+        self._run_ms = 0.0
+
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    @staticmethod
+    def from_env(name: str, workers: int, max_queue: int, processes: bool = False) -> "Stage":
+        """Stage sized by <NAME>_WORKERS / <NAME>_QUEUE, falling back to the given defaults"""
+        prefix = name.upper()
+        return Stage(
+            name,
+            int(os.getenv(f"{prefix}_WORKERS", str(workers))),
+            int(os.getenv(f"{prefix}_QUEUE", str(max_queue))),
+            processes=processes,
+        )
+
+    async def run(self, fn: Callable[..., Any], *args, deadline: Optional[float] = None) -> Any:
+        """Run fn(*args) on this stage's executor once a slot is free.
+
+        Raises StageFull if the queue is full, or TimeoutError if deadline passes
+        while waiting. A job that has started is never abandoned mid-run: if the
+        caller is cancelled, the job keeps its slot until it actually finishes -
+        fn must enforce the deadline itself."""
+        queued_at = time.perf_counter()
+        if self._slots.locked():
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise StageFull(f"{self.name} queue is full ({self.queued} waiting)")
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), remaining(deadline))
+            except TimeoutError:
+                self.timed_out += 1
+                raise TimeoutError(f"Job deadline exceeded waiting for {self.name}") from None
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+
+        started_at = time.perf_counter()
+        self._wait_ms += (started_at - queued_at) * 1000
+        self.active += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.executor(), fn, *args)
+        except BaseException:
+            self._finish(None, started_at)
+            raise
+        # The slot is released when the job finishes, not when the caller stops waiting
+        future.add_done_callback(lambda done: self._finish(done, started_at))
+        return await asyncio.shield(future)
+
+    def _finish(self, future: Optional[asyncio.Future], started_at: float):
+        self._run_ms += (time.perf_counter() - started_at) * 1000
+        self.active -= 1
+        self._slots.release()
+        # Also marks the exception retrieved when the caller was cancelled and never sees it
+        if future is None or future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "workers": self.workers,
+            "executor": "process" if self.processes else "thread",
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self._wait_ms / finished, 1) if finished else None,
+            "avg_run_ms": round(self._run_ms / finished, 1) if finished else None,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# yt-dlp downloads are network-bound: threads are enough
+download_stage = Stage.from_env("download", workers=4, max_queue=16)
+# ffmpeg runs as a subprocess, so a thread per concurrent transcode
+transcode_stage = Stage.from_env("transcode", workers=os.cpu_count() or 1, max_queue=16)
+# ACRCloud fingerprinting is CPU-bound inside the SDK - keep it off the server process
+recognize_stage = Stage.from_env("recognize", workers=2, max_queue=32, processes=True)
+# Local fingerprinting is NumPy work against the in-process index, so threads
+fingerprint_stage = Stage.from_env("fingerprint", workers=2, max_queue=32)
+
+STAGES = [download_stage, transcode_stage, recognize_stage, fingerprint_stage]
+
+
+def stage_stats() -> dict:
+    return {stage.name: stage.stats() for stage in STAGES}
+
+
+def shutdown_stages():
+    for stage in STAGES:
+        stage.shutdown()
@@ -0,0 +1,152 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from stages import remaining
+from youtube_audio import CLIP_SAMPLE_RATE
+
+# Largest upload we'll read; anything bigger is rejected rather than buffered
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Whole-request cap for /recognize/batch, which can carry several files
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_BYTES", str(4 * MAX_UPLOAD_BYTES)))
+# Room for multipart boundaries, part headers and form fields around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# How much of an upload is decoded for recognition (16 kHz mono: ~32 KB per second)
+UPLOAD_CLIP_SECONDS = float(os.getenv("UPLOAD_CLIP_SECONDS", "30"))
+# ffmpeg's WAV header; output no longer than this holds no samples
+WAV_HEADER_BYTES = 44
+
+
+class UploadTooLarge(Exception):
+    """Upload exceeded MAX_UPLOAD_BYTES"""
+
+
+class UploadLimitMiddleware:
+    """Rejects request bodies over a per-path byte limit with 413 before they're parsed.
+
+    Starlette spools the whole multipart body to a temp file before the endpoint
+    runs, so the limit has to be enforced on the raw stream: a Content-Length over
+    the limit is refused without reading anything, and bodies without one
+    (chunked) are counted as they arrive and cut off at the limit."""
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        detail = f"Upload exceeds {limit // (1024 * 1024)} MB"
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing; FastAPI passes HTTPExceptions through as-is
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _clip_command(source: str, clip_seconds: float) -> list:
+    return ['ffmpeg', '-loglevel', 'error', '-i', source, '-t', f"{clip_seconds:.2f}",
+            '-vn', '-ac', '1', '-ar', str(CLIP_SAMPLE_RATE), '-f', 'wav', 'pipe:1']
+
+
+def decode_upload_clip(source: BinaryIO, max_bytes: int = MAX_UPLOAD_BYTES,
+                       clip_seconds: float = UPLOAD_CLIP_SECONDS, deadline: Optional[float] = None) -> bytes:
+    """Decode the first clip_seconds of an uploaded file to an in-memory 16 kHz mono WAV.
+
+    The upload is fed to ffmpeg's stdin in chunks and reading stops as soon as
+    ffmpeg has the clip, so memory stays at one chunk plus the clip whatever the
+    file's size. Raises UploadTooLarge past max_bytes and TimeoutError at deadline."""
+    timeout = remaining(deadline)
+    process = subprocess.Popen(_clip_command('pipe:0', clip_seconds),
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output = {}
+    readers = [
+        threading.Thread(target=lambda name=name: output.__setitem__(name, getattr(process, name).read()))
+        for name in ('stdout', 'stderr')
+    ]
+    for reader in readers:
+        reader.start()
+    # A stalled ffmpeg would block the stdin writes below - kill it at the deadline
+    watchdog = threading.Timer(timeout, process.kill) if timeout is not None else None
+    if watchdog:
+        watchdog.start()
+
+    received = 0
+    try:
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB")
+            try:
+                process.stdin.write(chunk)
+            except BrokenPipeError:
+                # ffmpeg exits once it has clip_seconds of audio - the rest isn't needed
+                break
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        process.wait()
+    finally:
+        if watchdog:
+            watchdog.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        for reader in readers:
+            reader.join()
+
+    if deadline is not None and time.time() >= deadline:
+        raise TimeoutError("ffmpeg killed at the job deadline")
+    if process.returncode != 0:
+        if getattr(source, 'seekable', lambda: False)():
+            # Some containers (MP4/M4A with the index at the end) can't be decoded from a pipe
+            return _decode_seekable(source, max_bytes, clip_seconds, deadline)
+        raise subprocess.CalledProcessError(process.returncode, 'ffmpeg', output.get('stdout'), output.get('stderr'))
+    if len(output['stdout']) <= WAV_HEADER_BYTES:
+        raise ValueError("ffmpeg produced no audio for the upload")
+    return output['stdout']
+
+
+def _decode_seekable(source: BinaryIO, max_bytes: int, clip_seconds: float, deadline: Optional[float]) -> bytes:
+    """Fallback for uploads ffmpeg must seek in: copy to a temp file (still capped) and decode from there"""
+    source.seek(0)
+    with tempfile.NamedTemporaryFile() as copy:
+        while chunk := source.read(UPLOAD_CHUNK_BYTES):
+            if copy.tell() + len(chunk) > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB")
+            copy.write(chunk)
+        copy.flush()
+        try:
+            result = subprocess.run(_clip_command(copy.name, clip_seconds), check=True, capture_output=True,
+                                    timeout=remaining(deadline))
+        except subprocess.TimeoutExpired:
+            raise TimeoutError("ffmpeg killed at the job deadline") from None
+    if len(result.stdout) <= WAV_HEADER_BYTES:
+        raise ValueError("ffmpeg produced no audio for the upload")
+    return result.stdout
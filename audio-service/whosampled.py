@@ -1,10 +1,180 @@
-import requests
+import asyncio
+import httpx
 from bs4 import BeautifulSoup
 import re
 import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from single_flight import SingleFlight
+from whosampled_cache import WhoSampledCache, HIT, EMPTY, ERROR
+
+try:
+    import lxml.html
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:  # fall back to BeautifulSoup's pure-Python parser
+    LXML_AVAILABLE = False
 
 # FlareSolverr URL - can be configured via env var
 FLARESOLVERR_URL = os.getenv("FLARESOLVERR_URL", "http://localhost:8191/v1")
+# Overall budget for one WhoSampled lookup (main page + list pages)
+WHOSAMPLED_DEADLINE_SECONDS = float(os.getenv("WHOSAMPLED_DEADLINE_SECONDS", "60"))
+FLARESOLVERR_MAX_CONNECTIONS = int(os.getenv("FLARESOLVERR_MAX_CONNECTIONS", "10"))
+# Warm browser sessions kept in FlareSolverr (one per concurrent fetch, extra fetches go stateless); 0 disables sessions
+FLARESOLVERR_SESSIONS = int(os.getenv("FLARESOLVERR_SESSIONS", "2"))
+FLARESOLVERR_SESSION_MAX_AGE_SECONDS = float(os.getenv("FLARESOLVERR_SESSION_MAX_AGE_SECONDS", "1800"))
+# Serve expired cache entries immediately and refresh them in the background
+WHOSAMPLED_STALE_WHILE_REVALIDATE = os.getenv("WHOSAMPLED_STALE_WHILE_REVALIDATE", "true").lower() == "true"
+
+# Pooled client shared by every FlareSolverr call (see close_client)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            # Read timeout matches the default maxTimeout (120 seconds) + buffer
+            timeout=httpx.Timeout(150, connect=10),
+            limits=httpx.Limits(max_connections=FLARESOLVERR_MAX_CONNECTIONS),
+        )
+    return _client
+
+
+def flaresolverr_endpoint() -> str:
+    flaresolverr_host = FLARESOLVERR_URL.split('/v1')[0] if '/v1' in FLARESOLVERR_URL else FLARESOLVERR_URL
+    return f"{flaresolverr_host}/v1"
+
+
+@dataclass
+class FlareSession:
+    id: str
+    created_at: float
+    uses: int = 0
+
+
+class SessionPool:
+    """Pool of warm FlareSolverr sessions.
+
+    A session keeps its browser context (and the Cloudflare clearance cookies in
+    it) between requests, so only its first fetch pays for the challenge. Each
+    session serves one fetch at a time; when all are busy the fetch goes out
+    stateless instead of queueing. Sessions that fail or get older than max_age
+    are destroyed and replaced on next use."""
+
+    def __init__(self, size: int = FLARESOLVERR_SESSIONS, max_age: float = FLARESOLVERR_SESSION_MAX_AGE_SECONDS):
+        self.size = size
+        self.max_age = max_age
+        self._slots = asyncio.Semaphore(max(1, size))
+        self._idle: List[FlareSession] = []
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+        self.stateless = 0
+        # Background creates/destroys (recycled sessions, cancelled checkouts), referenced until they finish
+        self._cleanups = set()
+
+    async def _command(self, payload: dict) -> dict:
+        response = await get_client().post(flaresolverr_endpoint(), json=payload, timeout=httpx.Timeout(60, connect=10))
+        response.raise_for_status()
+        return response.json()
+
+    async def checkout(self) -> Optional[FlareSession]:
+        """Take a session for one fetch (call checkin after). Returns None when
+        sessions are disabled, all busy or can't be created, meaning a stateless request."""
+        if self.size <= 0:
+            return None
+        if self._slots.locked():
+            # Queueing for a session would cap WhoSampled traffic at the pool size
+            self.stateless += 1
+            return None
+        await self._slots.acquire()
+        creating = None
+        try:
+            while self._idle:
+                session = self._idle.pop()
+                if time.time() - session.created_at < self.max_age:
+                    session.uses += 1
+                    self.reused += 1
+                    return session
+                self._track(asyncio.ensure_future(self._destroy(session)))
+            # Shielded so a cancelled checkout still learns the ID of the session it asked for
+            creating = asyncio.ensure_future(self._command({"cmd": "sessions.create"}))
+            data = await asyncio.shield(creating)
+            if data.get("status") != "ok" or not data.get("session"):
+                raise ValueError(data.get("message", "no session returned"))
+        except Exception as e:
+            print(f"[WhoSampled] Could not create FlareSolverr session, fetching without one: {type(e).__name__}: {str(e)}", flush=True)
+            self._slots.release()
+            return None
+        except BaseException:
+            # Cancelled (usually the lookup deadline): give the slot back, and destroy the
+            # session FlareSolverr is creating for us once it exists
+            self._slots.release()
+            if creating is not None:
+                self._track(creating)
+                creating.add_done_callback(self._discard_created)
+            raise
+        self.created += 1
+        print(f"[WhoSampled] Created FlareSolverr session {data['session']}", flush=True)
+        return FlareSession(data["session"], time.time(), uses=1)
+
+    def checkin(self, session: Optional[FlareSession], healthy: bool):
+        """Return a session after its fetch. Never waits: this also runs when the fetch is
+        cancelled at the lookup deadline, so unhealthy sessions are destroyed in the background."""
+        if session is None:
+            return
+        if healthy and time.time() - session.created_at < self.max_age:
+            self._idle.append(session)
+        else:
+            self._track(asyncio.ensure_future(self._destroy(session)))
+        self._slots.release()
+
+    async def _destroy(self, session: FlareSession):
+        self.recycled += 1
+        try:
+            await self._command({"cmd": "sessions.destroy", "session": session.id})
+        except Exception as e:
+            print(f"[WhoSampled] Could not destroy FlareSolverr session {session.id}: {type(e).__name__}", flush=True)
+
+    def _track(self, task: asyncio.Future):
+        self._cleanups.add(task)
+        task.add_done_callback(self._cleanups.discard)
+
+    def _discard_created(self, creating: asyncio.Future):
+        if creating.cancelled() or creating.exception() is not None:
+            return
+        data = creating.result()
+        if data.get("status") == "ok" and data.get("session"):
+            self._track(asyncio.ensure_future(self._destroy(FlareSession(data["session"], time.time()))))
+
+    async def close(self):
+        while self._idle:
+            await self._destroy(self._idle.pop())
+        await asyncio.gather(*self._cleanups, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "created": self.created,
+            "reused": self.reused,
+            "recycled": self.recycled,
+            "stateless": self.stateless,
+        }
+
+
+session_pool = SessionPool()
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await session_pool.close()
+        await _client.aclose()
+        _client = None
 
 def clean_track_title(title: str) -> str:
     """Remove common suffixes like (Radio Edit), (Remastered), etc."""
@@ -35,11 +205,15 @@ def slugify(text: str) -> str:
     text = re.sub(r'[-\s]+', '-', text).strip('-')
     return text.title().replace(' ', '-')
 
-def fetch_with_flaresolverr(url: str, max_timeout: int = 120000, retries: int = 2) -> str:
-    """Fetch a URL using FlareSolverr to bypass Cloudflare with retry logic"""
+async def fetch_with_flaresolverr(url: str, max_timeout: int = 120000, retries: int = 2) -> str:
+    """Fetch a URL using FlareSolverr to bypass Cloudflare with retry logic.
+    Uses a warm session from session_pool when one is available."""
     flaresolverr_host = FLARESOLVERR_URL.split('/v1')[0] if '/v1' in FLARESOLVERR_URL else FLARESOLVERR_URL
     
     for attempt in range(retries + 1):
+        session = await session_pool.checkout()
+        # Failed sessions are recycled, so a retry starts from a fresh browser context
+        healthy = False
         try:
             if attempt > 0:
                 print(f"[WhoSampled] Retry attempt {attempt}/{retries} for {url}", flush=True)
@@ -52,12 +226,15 @@ def fetch_with_flaresolverr(url: str, max_timeout: int = 120000, retries: int =
                 "maxTimeout": max_timeout,
                 "returnOnlyCookies": False
             }
+            if session:
+                payload["session"] = session.id
             
-            # Increase timeout to match maxTimeout (120 seconds = 120000ms) + buffer
-            response = requests.post(f"{flaresolverr_host}/v1", json=payload, timeout=150)
-
+            # Allow FlareSolverr its maxTimeout + buffer
+            response = await get_client().post(
+                flaresolverr_endpoint(), json=payload, timeout=httpx.Timeout(max_timeout / 1000 + 30, connect=10)
+            )
             
-            if not response.ok:
+            if not response.is_success:
                 error_text = response.text[:500] if response.text else "No error message"
                 print(f"[WhoSampled] FlareSolverr HTTP error: {response.status_code} - {error_text}", flush=True)
                 if attempt < retries:
@@ -67,6 +244,7 @@ def fetch_with_flaresolverr(url: str, max_timeout: int = 120000, retries: int =
             data = response.json()
             
             if data.get("status") == "ok":
+                healthy = True
                 solution = data.get("solution", {})
                 response_html = solution.get("response", "")
                 if response_html:
@@ -86,15 +264,15 @@ def fetch_with_flaresolverr(url: str, max_timeout: int = 120000, retries: int =
                 
                 return ""
                 
-        except requests.exceptions.ConnectionError as e:
+        except httpx.ConnectError as e:
             print(f"[WhoSampled] FlareSolverr connection error: Cannot connect to {FLARESOLVERR_URL}. Is FlareSolverr deployed and FLARESOLVERR_URL set correctly?", flush=True)
             return ""
-        except requests.exceptions.Timeout:
-            print(f"[WhoSampled] FlareSolverr timeout: Request took longer than 150 seconds", flush=True)
+        except httpx.TimeoutException:
+            print(f"[WhoSampled] FlareSolverr timeout: Request took longer than {max_timeout / 1000 + 30:.0f} seconds", flush=True)
             if attempt < retries:
                 continue
             return ""
-        except requests.exceptions.JSONDecodeError as e:
+        except ValueError as e:
             print(f"[WhoSampled] FlareSolverr JSON decode error: {str(e)}. Response: {response.text[:200] if 'response' in locals() else 'N/A'}", flush=True)
             return ""
         except Exception as e:
@@ -102,53 +280,104 @@ def fetch_with_flaresolverr(url: str, max_timeout: int = 120000, retries: int =
             if attempt < retries:
                 continue
             return ""
+        finally:
+            session_pool.checkin(session, healthy)
     
     return ""
 
+def _has_class(name: str) -> str:
+    """XPath predicate matching elements whose class list contains name (like CSS .name)"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+if LXML_AVAILABLE:
+    # Compiled once; the same selectors as the BeautifulSoup path below
+    _SUBSECTIONS = etree.XPath(f"//section[{_has_class('subsection')}]")
+    _SECTION_HEADER = etree.XPath(f".//h3[{_has_class('section-header-title')}]")
+    _TABLE_ROWS = etree.XPath(f".//table[{_has_class('tdata')}]//tbody//tr")
+    _TRACK_CELL = etree.XPath(f".//td[{_has_class('tdata__td2')}]//a[{_has_class('trackName')}]")
+    _ARTIST_CELL = etree.XPath(f".//td[{_has_class('tdata__td3')}]//a")
+    # Parse from UTF-8 bytes: str input with an XML encoding declaration is rejected by lxml
+    _HTML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+
+def _lxml_document(html: str):
+    return lxml.html.fromstring(html.encode("utf-8"), parser=_HTML_PARSER)
+
+
+def _text(element) -> str:
+    # Same as BeautifulSoup's get_text(strip=True)
+    return "".join(part.strip() for part in element.itertext())
+
+
+def _dedupe(entries) -> list:
+    """Unique {"title", "artist"} dicts in first-seen order"""
+    results = []
+    seen = set()
+    for title, artist in entries:
+        if (title, artist) not in seen:
+            seen.add((title, artist))
+            results.append({"title": title, "artist": artist})
+    return results
+
+
+def _parse_rows(rows) -> list:
+    """parse_table_rows for whichever backend produced rows"""
+    if not LXML_AVAILABLE:
+        return parse_table_rows(rows)
+    entries = []
+    for row in rows:
+        track_cells = _TRACK_CELL(row)
+        artist_cells = _ARTIST_CELL(row)
+        if track_cells and artist_cells:
+            entries.append((_text(track_cells[0]), _text(artist_cells[0])))
+    return _dedupe(entries)
+
+
 def parse_table_rows(rows, limit: int = None) -> list:
     """Parse table rows and extract track info. No limit by default."""
-    results = []
     rows_to_parse = rows[:limit] if limit else rows
+    entries = []
     for row in rows_to_parse:
         track_cell = row.select_one("td.tdata__td2 a.trackName")
         artist_cell = row.select_one("td.tdata__td3 a")
         
         if track_cell and artist_cell:
-            title = track_cell.get_text(strip=True)
-            artist = artist_cell.get_text(strip=True)
-            entry = {"title": title, "artist": artist}
-            if entry not in results:
-                results.append(entry)
-    return results
+            entries.append((track_cell.get_text(strip=True), artist_cell.get_text(strip=True)))
+    return _dedupe(entries)
+
+def _main_page_sections(html: str):
+    """(lowercased header text, table rows) for each subsection of a track page"""
+    if LXML_AVAILABLE:
+        for subsection in _SUBSECTIONS(_lxml_document(html)):
+            headers = _SECTION_HEADER(subsection)
+            if headers:
+                yield _text(headers[0]).lower(), _TABLE_ROWS(subsection)
+        return
+    
+    soup = BeautifulSoup(html, "html.parser")
+    for subsection in soup.find_all("section", class_="subsection"):
+        header = subsection.find("h3", class_="section-header-title")
+        if header:
+            yield header.get_text(strip=True).lower(), subsection.select("table.tdata tbody tr")
 
 def parse_main_page(html: str) -> dict:
     """Parse the main track page for sample info and counts"""
-    soup = BeautifulSoup(html, "html.parser")
-    
     samples = []
     sampled_by = []
     samples_count = 0
     sampled_count = 0
     
-    subsections = soup.find_all("section", class_="subsection")
-    
-    for subsection in subsections:
-        header = subsection.find("h3", class_="section-header-title")
-        if not header:
-            continue
-        
-        header_text = header.get_text(strip=True).lower()
-        rows = subsection.select("table.tdata tbody tr")
-        
+    for header_text, rows in _main_page_sections(html):
         # Extract count from header
         match = re.search(r'(\d+)', header_text)
         count = int(match.group(1)) if match else len(rows)
         
         if "contains sample" in header_text:
-            samples = parse_table_rows(rows)  # Get all from main page
+            samples = _parse_rows(rows)  # Get all from main page
             samples_count = count
         elif "sampled in" in header_text:
-            sampled_by = parse_table_rows(rows)  # Get all from main page
+            sampled_by = _parse_rows(rows)  # Get all from main page
             sampled_count = count
     
     return {
@@ -160,38 +389,109 @@ def parse_main_page(html: str) -> dict:
 
 def parse_list_page(html: str) -> list:
     """Parse a samples or sampled list page - returns all entries"""
+    if LXML_AVAILABLE:
+        return _parse_rows(_TABLE_ROWS(_lxml_document(html)))
     soup = BeautifulSoup(html, "html.parser")
     rows = soup.select("table.tdata tbody tr")
     return parse_table_rows(rows)
 
-async def search_whosampled(track_title: str, artist_name: str) -> dict:
-    """Search WhoSampled for sample information using FlareSolverr"""
+whosampled_cache = WhoSampledCache()
+# Lookups in progress by cache key, shared by concurrent callers and background refreshes
+_lookups = SingleFlight()
+
+
+async def search_whosampled(track_title: str, artist_name: str,
+                            deadline_seconds: float = WHOSAMPLED_DEADLINE_SECONDS) -> dict:
+    """Search WhoSampled for sample information using FlareSolverr.
+    Cached results are returned straight away; stale ones are refreshed in the background."""
     clean_title = clean_track_title(track_title)
     
     artist_slug = slugify(artist_name)
     track_slug = slugify(clean_title)
     base_url = f"https://www.whosampled.com/{artist_slug}/{track_slug}"
     
+    cached = whosampled_cache.get(base_url)
+    if cached is not None:
+        value, fresh = cached
+        if fresh:
+            return value
+        if WHOSAMPLED_STALE_WHILE_REVALIDATE:
+            print(f"[WhoSampled] Serving stale result for {base_url}, refreshing in background", flush=True)
+            _lookups.start(base_url, lambda: _fetch_and_cache(base_url, deadline_seconds))
+            return value
+    
+    return await _lookups.do(base_url, lambda: _fetch_and_cache(base_url, deadline_seconds))
+
+
+async def _fetch_and_cache(base_url: str, deadline_seconds: float) -> dict:
+    """Fetch base_url and store the result in the cache"""
+    try:
+        result, kind = await fetch_whosampled(base_url, deadline_seconds)
+        whosampled_cache.put(base_url, result, kind)
+    except Exception as e:
+        # Background refreshes have no one awaiting them - log their failures here
+        print(f"[WhoSampled] Lookup failed for {base_url}: {type(e).__name__}: {e}", flush=True)
+        raise
+    return result
+
+
+async def fetch_whosampled(base_url: str, deadline_seconds: float = WHOSAMPLED_DEADLINE_SECONDS) -> Tuple[dict, str]:
+    """Fetch sample lists for a WhoSampled track URL within deadline_seconds.
+    Returns (result, kind) where kind says how long the result should be cached."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_seconds
+    
+    def max_timeout_ms() -> int:
+        # FlareSolverr gives up at maxTimeout; never let it run past our deadline
+        return max(1000, min(120000, int((deadline - loop.time()) * 1000)))
+    
     main_url = f"{base_url}/"
-    main_html = fetch_with_flaresolverr(main_url)
+    try:
+        main_html = await asyncio.wait_for(
+            fetch_with_flaresolverr(main_url, max_timeout_ms()), deadline - loop.time()
+        )
+    except asyncio.TimeoutError:
+        print(f"[WhoSampled] Deadline of {deadline_seconds:.0f}s exceeded fetching {main_url}", flush=True)
+        return {"sampled_by": [], "samples": []}, ERROR
     
     if not main_html:
-        return {"sampled_by": [], "samples": []}
+        return {"sampled_by": [], "samples": []}, ERROR
     
     data = parse_main_page(main_html)
     samples = data["samples"]
     sampled_by = data["sampled_by"]
+    complete = True
     
+    # The main page only lists the first few entries - fetch the full lists concurrently
+    list_pages = {}
     if data["samples_count"] > 3:
-        samples_url = f"{base_url}/samples/"
-        samples_html = fetch_with_flaresolverr(samples_url)
-        if samples_html:
-            samples = parse_list_page(samples_html)
-    
+        list_pages["samples"] = f"{base_url}/samples/"
     if data["sampled_count"] > 3:
-        sampled_url = f"{base_url}/sampled/"
-        sampled_html = fetch_with_flaresolverr(sampled_url)
-        if sampled_html:
-            sampled_by = parse_list_page(sampled_html)
+        list_pages["sampled_by"] = f"{base_url}/sampled/"
+    
+    if list_pages:
+        tasks = {
+            asyncio.create_task(fetch_with_flaresolverr(list_url, max_timeout_ms())): name
+            for name, list_url in list_pages.items()
+        }
+        done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - loop.time()))
+        for task in pending:
+            # Keep the main page's partial list for anything that didn't make the deadline
+            print(f"[WhoSampled] Deadline of {deadline_seconds:.0f}s exceeded fetching {list_pages[tasks[task]]}", flush=True)
+            task.cancel()
+            complete = False
+        for task in done:
+            list_html = task.result()
+            if not list_html:
+                complete = False
+                continue
+            if tasks[task] == "samples":
+                samples = parse_list_page(list_html)
+            else:
+                sampled_by = parse_list_page(list_html)
     
-    return {"sampled_by": sampled_by, "samples": samples}
+    result = {"sampled_by": sampled_by, "samples": samples}
+    # Partial lists are only cached briefly so the full ones are fetched again soon
+    if not complete:
+        return result, ERROR
+    return result, HIT if samples or sampled_by else EMPTY
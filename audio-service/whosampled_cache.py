@@ -0,0 +1,101 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+# SQLite file holding WhoSampled lookups, keyed by the track's WhoSampled URL
+WHOSAMPLED_CACHE_PATH = os.getenv("WHOSAMPLED_CACHE_PATH", "data/whosampled_cache.db")
+# How long each kind of result stays fresh
+WHOSAMPLED_HIT_TTL_SECONDS = float(os.getenv("WHOSAMPLED_HIT_TTL_SECONDS", str(7 * 86400)))
+WHOSAMPLED_EMPTY_TTL_SECONDS = float(os.getenv("WHOSAMPLED_EMPTY_TTL_SECONDS", "86400"))
+WHOSAMPLED_ERROR_TTL_SECONDS = float(os.getenv("WHOSAMPLED_ERROR_TTL_SECONDS", "600"))
+# How long past freshness an entry may still be served while it's refreshed in the background
+WHOSAMPLED_STALE_SECONDS = float(os.getenv("WHOSAMPLED_STALE_SECONDS", str(30 * 86400)))
+WHOSAMPLED_CACHE_MAX_ENTRIES = int(os.getenv("WHOSAMPLED_CACHE_MAX_ENTRIES", "20000"))
+
+# Kinds of cached result
+HIT = "hit"  # samples found
+EMPTY = "empty"  # page fetched (or 404) but nothing listed
+ERROR = "error"  # FlareSolverr failed or the lookup ran out of time
+
+
+class WhoSampledCache:
+    """Persistent cache of WhoSampled lookups with negative caching.
+
+    Hits, empty results and failures get separate TTLs, so failures are retried
+    soon while hits are kept for days. A failure never overwrites an earlier
+    hit - it only postpones the next refresh. Expired entries stay servable for
+    stale_seconds so callers can answer immediately and refresh in the background."""
+
+    def __init__(self, path: str = WHOSAMPLED_CACHE_PATH, stale_seconds: float = WHOSAMPLED_STALE_SECONDS,
+                 max_entries: int = WHOSAMPLED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttls = {
+            HIT: WHOSAMPLED_HIT_TTL_SECONDS,
+            EMPTY: WHOSAMPLED_EMPTY_TTL_SECONDS,
+            ERROR: WHOSAMPLED_ERROR_TTL_SECONDS,
+        }
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.counters = {"fresh_hits": 0, "stale_hits": 0, "misses": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS whosampled (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key: str) -> Optional[Tuple[dict, bool]]:
+        """(value, is_fresh) for key, or None if missing or too stale to serve"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM whosampled WHERE key = ? AND expires_at > ?",
+                (key, now - self.stale_seconds),
+            ).fetchone()
+        if row is None:
+            self.counters["misses"] += 1
+            return None
+        fresh = row[1] > now
+        self.counters["fresh_hits" if fresh else "stale_hits"] += 1
+        return json.loads(row[0]), fresh
+
+    def put(self, key: str, value: dict, kind: str):
+        now = time.time()
+        expires_at = now + self.ttls[kind]
+        with self._connect() as conn:
+            if kind == ERROR:
+                # Keep serving the last good result; just don't retry until the error TTL is up
+                updated = conn.execute(
+                    "UPDATE whosampled SET expires_at = ? WHERE key = ? AND kind != ?", (expires_at, key, ERROR)
+                ).rowcount
+                if updated:
+                    return
+            conn.execute(
+                "INSERT OR REPLACE INTO whosampled (key, value, kind, fetched_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), kind, now, expires_at),
+            )
+            # Drop entries too stale to serve, then the oldest beyond the cap
+            conn.execute("DELETE FROM whosampled WHERE expires_at <= ?", (now - self.stale_seconds,))
+            conn.execute(
+                "DELETE FROM whosampled WHERE key NOT IN "
+                "(SELECT key FROM whosampled ORDER BY fetched_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries = conn.execute("SELECT kind, COUNT(*) FROM whosampled GROUP BY kind").fetchall()
+        return {**self.counters, "entries": dict(entries)}
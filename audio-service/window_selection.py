@@ -0,0 +1,56 @@
+import os
+from typing import List
+
+import numpy as np
+
+from fingerprint import FFT_SIZE, HOP_SIZE, SAMPLE_RATE, spectrogram
+
+# Windows submitted to ACRCloud per recognition, and the length of each (the SDK's default rec_length)
+RECOGNIZE_WINDOWS = int(os.getenv("RECOGNIZE_WINDOWS", "3"))
+RECOGNIZE_WINDOW_SECONDS = int(os.getenv("RECOGNIZE_WINDOW_SECONDS", "10"))
+# Frames quieter than this fraction of the loud end of the audio count as silence
+SILENCE_RATIO = 0.1
+
+
+def frame_scores(samples: np.ndarray) -> np.ndarray:
+    """Per-frame musicality in [0, 1]: loudness (RMS) weighted by spectral flux.
+
+    Silence scores 0; sustained, changing sound (notes, beats) scores highest.
+    Frames line up with the fingerprint spectrogram's."""
+    spec = spectrogram(samples)
+    if not len(spec):
+        return np.zeros(0, dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    flux = np.concatenate([[0.0], np.maximum(np.diff(spec, axis=0), 0).sum(axis=1)])
+
+    # Normalise against the loud/busy end rather than the max, so one spike doesn't flatten everything
+    loud = np.percentile(rms, 95) or 1.0
+    busy = np.percentile(flux, 95) or 1.0
+    scores = np.minimum(rms / loud, 1) * (0.5 + 0.5 * np.minimum(flux / busy, 1))
+    scores[rms < SILENCE_RATIO * loud] = 0
+    return scores
+
+
+def best_windows(samples: np.ndarray, count: int = RECOGNIZE_WINDOWS,
+                 window_seconds: int = RECOGNIZE_WINDOW_SECONDS) -> List[int]:
+    """Start seconds of up to count non-overlapping windows with the most musical audio, best first"""
+    if len(samples) <= window_seconds * SAMPLE_RATE:
+        return [0]
+    scores = frame_scores(samples)
+    frames_per_second = SAMPLE_RATE / HOP_SIZE
+    starts = np.arange(int(len(samples) / SAMPLE_RATE - window_seconds) + 1)
+
+    # Mean frame score of every whole-second window, via a running sum
+    cumulative = np.concatenate([[0.0], np.cumsum(scores)])
+    first = np.minimum((starts * frames_per_second).astype(int), len(scores) - 1)
+    last = np.minimum(((starts + window_seconds) * frames_per_second).astype(int), len(scores))
+    window_scores = (cumulative[last] - cumulative[first]) / np.maximum(last - first, 1)
+
+    chosen = []
+    for start in starts[np.argsort(-window_scores, kind="stable")]:
+        if all(abs(int(start) - other) >= window_seconds for other in chosen):
+            chosen.append(int(start))
+            if len(chosen) == count:
+                break
+    return chosen
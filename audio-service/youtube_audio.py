@@ -0,0 +1,154 @@
+import os
+import subprocess
+import time
+from typing import Optional
+
+import yt_dlp
+from yt_dlp.utils import DownloadCancelled
+
+from stages import remaining
+
+# Length of the window decoded for recognition - ACRCloud only needs 10-15 s
+CLIP_SECONDS = float(os.getenv("RECOGNIZE_CLIP_SECONDS", "12"))
+# Clips are decoded straight to small mono PCM; plenty for fingerprinting
+CLIP_SAMPLE_RATE = 16000
+# Heardle snippets only need to sound OK on a phone speaker
+SNIPPET_BITRATE = os.getenv("SNIPPET_BITRATE", "64k")
+# Transcode full tracks straight from the stream URL instead of downloading the source file first
+YOUTUBE_PIPED = os.getenv("YOUTUBE_PIPED", "true").lower() in ("1", "true", "yes")
+# Same encoder settings as yt-dlp's FFmpegExtractAudio postprocessor
+MP3_ARGS = ['-vn', '-acodec', 'libmp3lame', '-q:a', '5']
+
+
+def _ydl_opts(deadline: Optional[float]) -> dict:
+    """Common yt-dlp options; downloads abort once deadline (time.time()) passes"""
+    def check_deadline(progress):
+        if deadline is not None and time.time() >= deadline:
+            raise DownloadCancelled("Job deadline exceeded")
+
+    opts = {
+        'format': 'bestaudio/best',
+        'quiet': True,
+        'no_warnings': True,
+        'noplaylist': True,
+        'progress_hooks': [check_deadline],
+    }
+    if deadline is not None:
+        # Don't let a stalled socket outlive the job
+        opts['socket_timeout'] = max(1.0, min(30.0, remaining(deadline)))
+    return opts
+
+
+def _run_ffmpeg(command: list, deadline: Optional[float]) -> bytes:
+    """Run ffmpeg, killing it if it's still going at deadline; returns its stdout"""
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, timeout=remaining(deadline))
+    except subprocess.TimeoutExpired:
+        raise TimeoutError("ffmpeg killed at the job deadline") from None
+    return result.stdout
+
+
+def download_audio(url: str, temp_dir: str, deadline: Optional[float] = None) -> str:
+    """Download the best audio stream for url into temp_dir as-is; returns its path"""
+    ydl_opts = {
+        **_ydl_opts(deadline),
+        'outtmpl': os.path.join(temp_dir, 'source.%(ext)s'),
+    }
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=True)
+            source_file = ydl.prepare_filename(info)
+    except DownloadCancelled:
+        raise TimeoutError("Download cancelled at the job deadline") from None
+
+    if not os.path.exists(source_file):
+        raise FileNotFoundError("Audio file not found")
+    return source_file
+
+
+def transcode_to_mp3(source_file: str, temp_dir: str, deadline: Optional[float] = None) -> str:
+    """Transcode a downloaded stream to MP3 with ffmpeg; returns the MP3 path"""
+    audio_file = os.path.join(temp_dir, 'audio.mp3')
+    _run_ffmpeg(['ffmpeg', '-y', '-loglevel', 'error', '-i', source_file, *MP3_ARGS, audio_file], deadline)
+    return audio_file
+
+
+def resolve_stream(url: str, deadline: Optional[float] = None) -> dict:
+    """Look up the best audio stream for url without downloading it.
+    Returns {"url", "headers", "duration"} (duration in seconds, or None)."""
+    with yt_dlp.YoutubeDL(_ydl_opts(deadline)) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    # Single-format results carry the URL at the top level, merged ones per format
+    stream = info if info.get('url') else info['requested_formats'][0]
+    return {
+        "url": stream['url'],
+        "headers": stream.get('http_headers') or info.get('http_headers') or {},
+        "duration": info.get('duration'),
+    }
+
+
+def clip_offset(duration: Optional[float], clip_seconds: float = CLIP_SECONDS) -> float:
+    """Start of a clip centred in the track (0 when the duration is unknown)"""
+    if not duration:
+        return 0.0
+    return max(0.0, (duration - clip_seconds) / 2)
+
+
+def _stream_input_args(stream: dict) -> list:
+    """ffmpeg input arguments reading a remote stream with yt-dlp's request headers"""
+    headers = "".join(f"{key}: {value}\r\n" for key, value in stream["headers"].items())
+    args = ['-headers', headers] if headers else []
+    return args + ['-i', stream["url"]]
+
+
+def _window_input_args(stream: dict, offset: float, seconds: float) -> list:
+    """ffmpeg input arguments reading only [offset, offset + seconds) of a remote stream.
+
+    Seeking on the input before opening it means only the byte ranges around
+    the window are fetched rather than the whole track."""
+    return ['-ss', f"{offset:.2f}", '-t', f"{seconds:.2f}", *_stream_input_args(stream)]
+
+
+def stream_to_mp3(stream: dict, temp_dir: str, deadline: Optional[float] = None) -> str:
+    """Transcode a whole remote stream to MP3 in one pass; returns the MP3 path.
+    ffmpeg reads the stream itself, so no source file is written or read back."""
+    audio_file = os.path.join(temp_dir, 'audio.mp3')
+    # A seekable output lets the encoder write the VBR header players use for duration
+    _run_ffmpeg(['ffmpeg', '-y', '-loglevel', 'error', *_stream_input_args(stream), *MP3_ARGS, audio_file],
+                deadline)
+    return audio_file
+
+
+def stream_to_mp3_bytes(stream: dict, deadline: Optional[float] = None) -> bytes:
+    """Transcode a whole remote stream to an in-memory MP3 read from ffmpeg's stdout"""
+    mp3 = _run_ffmpeg(['ffmpeg', '-loglevel', 'error', *_stream_input_args(stream), *MP3_ARGS, '-f', 'mp3', 'pipe:1'],
+                      deadline)
+    if not mp3:
+        raise ValueError("ffmpeg produced no audio for the stream")
+    return mp3
+
+
+def extract_clip(stream: dict, offset: float, clip_seconds: float = CLIP_SECONDS,
+                 deadline: Optional[float] = None) -> bytes:
+    """Decode only [offset, offset + clip_seconds) of a remote stream to an in-memory WAV"""
+    command = ['ffmpeg', '-loglevel', 'error', *_window_input_args(stream, offset, clip_seconds),
+               '-vn', '-ac', '1', '-ar', str(CLIP_SAMPLE_RATE), '-f', 'wav', 'pipe:1']
+
+    wav = _run_ffmpeg(command, deadline)
+    if not wav:
+        raise ValueError("ffmpeg produced no audio for the requested clip")
+    return wav
+
+
+def extract_snippet(stream: dict, start: float, length: float, temp_dir: str,
+                    deadline: Optional[float] = None) -> str:
+    """Encode [start, start + length) of a remote stream as a low-bitrate MP3; returns its path"""
+    snippet_file = os.path.join(temp_dir, 'snippet.mp3')
+    _run_ffmpeg(
+        ['ffmpeg', '-y', '-loglevel', 'error', *_window_input_args(stream, start, length),
+         '-vn', '-ac', '1', '-acodec', 'libmp3lame', '-b:a', SNIPPET_BITRATE, snippet_file],
+        deadline,
+    )
+    return snippet_file
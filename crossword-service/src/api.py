@@ -1,43 +1,56 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional, Dict
+from contextlib import asynccontextmanager
+import asyncio
 import json
+import os
 import uuid
 from datetime import datetime
-from zoneinfo import ZoneInfo
-from src.crossword_generator import CrosswordGenerator
-from src.models import Direction
+from src.crossword_generator import CrosswordGenerator, ENGINES, DEFAULT_ENGINE, SEARCH_BUDGET_MS
+from src.daily import get_or_create_daily, in_generation_window, pregenerate_daily, seconds_until_rollover, today
+from src.daily_store import DailyStore
 from src.llm_service import LLMService
+from src.multi_seed import seed_from_text, shutdown_pool
+from src.single_flight import SingleFlight
 
-app = FastAPI(title="Crossword Generator API", version="1.0.0")
+async def pregenerate_loop():
+    """Keep the next PREGENERATE_DAYS daily puzzles generated in the background"""
+    while True:
+        try:
+            await pregenerate_daily(daily_store, PREGENERATE_DAYS)
+        except Exception as e:
+            print(f"Error pre-generating daily crosswords: {e}")
+        await asyncio.sleep(PREGENERATE_INTERVAL_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await LLMService.startup()
+    pregenerate_task = asyncio.create_task(pregenerate_loop()) if PREGENERATE_DAYS > 0 else None
+    yield
+    if pregenerate_task:
+        pregenerate_task.cancel()
+    await LLMService.shutdown()
+    # Stop the multiseed worker processes
+    shutdown_pool()
+
+app = FastAPI(title="Crossword Generator API", version="1.0.0", lifespan=lifespan)
 
 # In-memory storage for clue data (could be replaced with Redis/database in production)
 clue_storage: Dict[str, Dict[str, str]] = {}
 
-# In-memory storage for daily puzzle answers (could be replaced with Redis/database in production)
-# Format: { "date": { "clue_id": "ANSWER" } }
-daily_answers: Dict[str, Dict[str, str]] = {}
+# Generated daily puzzles and their answers, persisted across restarts
+daily_store = DailyStore()
 
-# Daily themes (matching the Node.js version)
-DAILY_THEMES = [
-    {"topic": "Daniel Caesar", "type": "artist"},
-    {"topic": "SZA", "type": "artist"},
-    {"topic": "Drake", "type": "artist"},
-    {"topic": "Beyoncé", "type": "artist"},
-    {"topic": "90s Hip Hop", "type": "era"},
-    {"topic": "80s Rock", "type": "era"},
-    {"topic": "Classic Rock", "type": "era"},
-    {"topic": "Pop Music", "type": "genre"},
-    {"topic": "Hip Hop", "type": "genre"},
-    {"topic": "R&B", "type": "genre"},
-]
+# Concurrent /generate-from-topic requests for the same topic share one LLM call
+topic_generation = SingleFlight()
 
-def get_daily_theme(date_str: str) -> Dict[str, str]:
-    """Get theme for a specific date"""
-    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-    date_num = date_obj.day
-    return DAILY_THEMES[date_num % len(DAILY_THEMES)]
+# How many days ahead to keep pre-generated, and how often to top the store up
+PREGENERATE_DAYS = int(os.getenv("DAILY_PREGENERATE_DAYS", "7"))
+PREGENERATE_INTERVAL_SECONDS = int(os.getenv("DAILY_PREGENERATE_INTERVAL_SECONDS", "3600"))
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
@@ -50,9 +63,13 @@ app.add_middleware(
 
 class WordListRequest(BaseModel):
     words: List[str]
+    engine: Optional[str] = None
+    time_budget_ms: Optional[int] = None
+    seed: Optional[int] = None
 
 class TopicRequest(BaseModel):
     topic: str
+    regenerate: bool = False  # skip the LLM response cache
 
 class TopicWordsResponse(BaseModel):
     words: List[str]
@@ -87,6 +104,16 @@ class CrosswordResponse(BaseModel):
     message: str
     crossword_id: Optional[str] = None
 
+def resolve_engine(engine: Optional[str]) -> str:
+    """Validate the requested generation engine, falling back to the default"""
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown engine '{engine}'. Choose one of: {', '.join(ENGINES)}"
+        )
+    return engine
+
 @app.get("/")
 async def root():
     return {"message": "Crossword Generator API", "status": "running"}
@@ -117,9 +144,14 @@ async def generate_crossword(request: WordListRequest):
                 )
             cleaned_words.append(cleaned_word)
         
-        # Generate crossword
+        engine = resolve_engine(request.engine)
+        time_budget_ms = min(request.time_budget_ms or SEARCH_BUDGET_MS, SEARCH_BUDGET_MS)
+        
+        # Generate crossword (off the event loop - the search engine runs for its full budget)
+        # Same words give the same puzzle unless the caller picks a seed
+        seed = request.seed if request.seed is not None else seed_from_text(",".join(cleaned_words))
         generator = CrosswordGenerator(cleaned_words)
-        crossword = generator.generate_crossword()
+        crossword = await run_in_threadpool(generator.generate, engine, time_budget_ms, seed)
         
         # Check if crossword was successfully generated
         if len(crossword.word_placements) < 2:
@@ -188,8 +220,11 @@ async def generate_words_from_topic(request: TopicRequest):
         
         topic = request.topic.strip()
         
-        # Generate words and clues using LLM service
-        word_clue_data = await LLMService.generate_words_and_clues_from_topic(topic)
+        # Generate words and clues using LLM service (shared with concurrent requests for the same topic)
+        word_clue_data = await topic_generation.do(
+            (topic.lower(), request.regenerate),
+            lambda: LLMService.generate_words_and_clues_from_topic(topic, bypass_cache=request.regenerate)
+        )
         
         # Extract words and create clue mapping
         words = [item['word'] for item in word_clue_data]
@@ -225,6 +260,48 @@ async def generate_words_from_topic(request: TopicRequest):
             detail=f"Failed to generate words for topic: {str(e)}"
         )
 
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate-from-topic/stream")
+async def stream_words_from_topic(request: TopicRequest):
+    """Server-sent events version of /generate-from-topic.
+    Sends a `word` event per word-clue pair as soon as the model produces it, then
+    a `done` event with the crossword_id the clues are stored under."""
+    if not request.topic or not request.topic.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Please provide a topic"
+        )
+    
+    topic = request.topic.strip()
+    
+    async def events():
+        clue_mapping = {}
+        try:
+            async for pair in LLMService.stream_words_and_clues_from_topic(topic, bypass_cache=request.regenerate):
+                clue_mapping[pair['word']] = pair['clue']
+                yield sse_event("word", pair)
+        except Exception as e:
+            print(f"Error streaming words for topic '{topic}': {e}")
+            yield sse_event("error", {"message": f"Failed to generate words for topic: {str(e)}"})
+            return
+        
+        crossword_id = str(uuid.uuid4())
+        clue_storage[crossword_id] = clue_mapping
+        print(f"📝 Streamed {len(clue_mapping)} words for topic '{topic}'")
+        yield sse_event("done", {
+            "crossword_id": crossword_id,
+            "topic": topic,
+            "count": len(clue_mapping)
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/clues/{crossword_id}", response_model=CluesResponse)
 async def get_clues(crossword_id: str):
     try:
@@ -253,117 +330,36 @@ async def get_clues(crossword_id: str):
         )
 
 @app.get("/daily")
-async def get_daily_crossword(date: Optional[str] = None):
-    """Generate daily crossword for a specific date (format: YYYY-MM-DD)"""
+async def get_daily_crossword(request: Request, date: Optional[str] = None, engine: Optional[str] = None):
+    """Daily crossword for a specific date (format: YYYY-MM-DD).
+    Served from the puzzle store; generated on the spot only if it wasn't pre-generated
+    and the date is close to today. `engine` only applies when the puzzle has to be generated."""
     try:
+        engine = resolve_engine(engine)
         if not date:
-            date = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d")
-        
-        theme = get_daily_theme(date)
-        topic = theme["topic"]
-        
-        # Generate words and clues from topic
-        word_clue_data = await LLMService.generate_words_and_clues_from_topic(topic)
-        words = [item['word'].upper() for item in word_clue_data]
-        clue_mapping = {item['word'].upper(): item['clue'] for item in word_clue_data}
-        
-        # Generate crossword
-        generator = CrosswordGenerator(words, grid_size=15)
-        crossword = generator.generate_crossword()
-        
-        if len(crossword.word_placements) < 2:
-            raise HTTPException(
-                status_code=500,
-                detail="Could not generate valid crossword"
-            )
-        
-        # Convert to our format
-        # Create grid with clue IDs (like "1A", "2D")
-        grid_size = crossword.width
-        grid = [['X' for _ in range(grid_size)] for _ in range(grid_size)]
-        positions = {}
-        clues = {}
-        
-        # Assign numbers to starting positions
-        sorted_placements = sorted(crossword.word_placements, 
-                                 key=lambda p: (p.start_row, p.start_col))
-        position_numbers = {}
-        number = 1
-        for placement in sorted_placements:
-            pos_key = (placement.start_row, placement.start_col)
-            if pos_key not in position_numbers:
-                position_numbers[pos_key] = number
-                number += 1
-        
-        # First pass: assign clue IDs to starting positions
-        clue_id_map = {}  # maps (start_row, start_col, direction) to clue_id
-        for placement in crossword.word_placements:
-            pos_key = (placement.start_row, placement.start_col)
-            clue_num = position_numbers[pos_key]
-            direction_code = "A" if placement.direction == Direction.HORIZONTAL else "D"
-            clue_id = f"{clue_num}{direction_code}"
-            clue_id_map[(placement.start_row, placement.start_col, placement.direction)] = clue_id
-        
-        # Second pass: fill grid with clue IDs and build positions/clues/answers
-        # For intersections, store both clue IDs separated by "/"
-        answers = {}  # Store correct answers for this puzzle
-        
-        for placement in crossword.word_placements:
-            clue_id = clue_id_map[(placement.start_row, placement.start_col, placement.direction)]
-            
-            # Place clue ID in all cells of this word
-            for i in range(len(placement.word)):
-                if placement.direction == Direction.HORIZONTAL:
-                    row, col = placement.start_row, placement.start_col + i
-                else:
-                    row, col = placement.start_row + i, placement.start_col
-                
-                # Handle intersections by storing both clue IDs
-                if grid[row][col] == 'X':
-                    grid[row][col] = clue_id
-                elif grid[row][col] != clue_id:
-                    # This is an intersection - store both IDs
-                    existing = grid[row][col]
-                    # Make sure we don't duplicate
-                    if '/' not in existing:
-                        grid[row][col] = f"{existing}/{clue_id}"
-            
-            print(f"📍 Word {clue_id}: {placement.word} at ({placement.start_row},{placement.start_col}) {placement.direction.value}")
-            
-            # Store position (only once per clue_id)
-            if clue_id not in positions:
-                positions[clue_id] = {
-                    "row": placement.start_row,
-                    "col": placement.start_col,
-                    "direction": placement.direction.value,
-                    "length": len(placement.word)
-                }
-            
-            # Store clue (only once per clue_id)
-            if clue_id not in clues:
-                word_upper = placement.word.upper()
-                clue_text = clue_mapping.get(word_upper, f"{theme['topic']}-related term")
-                clues[clue_id] = {
-                    "clue": clue_text,
-                    "length": len(placement.word)
-                }
-            
-            # Store answer (only once per clue_id)
-            if clue_id not in answers:
-                answers[clue_id] = placement.word.upper()
-        
-        # Store answers for this date
-        daily_answers[date] = answers
-        
-        return {
-            "date": date,
-            "template": {
-                "grid": grid,
-                "positions": positions
-            },
-            "clues": clues,
-            "theme": theme
-        }
+            date = today()
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+        
+        if in_generation_window(date, PREGENERATE_DAYS):
+            # Not pre-generated puzzles are built once and kept for every later request
+            puzzle = await get_or_create_daily(daily_store, date, engine)
+        else:
+            # Anything further out would let clients spend LLM calls and store rows at will
+            puzzle = daily_store.get(date)
+            if puzzle is None:
+                raise HTTPException(status_code=404, detail=f"No daily crossword for {date}")
+        
+        etag = puzzle["etag"]
+        # Today's puzzle can be cached until the rollover; other dates never change
+        max_age = seconds_until_rollover() if date == today() else 86400
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        
+        return JSONResponse(content=puzzle["payload"], headers=headers)
         
     except HTTPException:
         raise
@@ -385,7 +381,8 @@ async def check_answers(request: dict):
             raise HTTPException(status_code=400, detail="Date is required")
         
         # Get correct answers for this date
-        correct_answers = daily_answers.get(date)
+        puzzle = daily_store.get(date)
+        correct_answers = puzzle["answers"] if puzzle else None
         
         if not correct_answers:
             raise HTTPException(
@@ -432,10 +429,11 @@ async def reveal_answers(date: Optional[str] = None):
     """Reveal all correct answers for a given date"""
     try:
         if not date:
-            date = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d")
+            date = today()
         
         # Get correct answers for this date
-        correct_answers = daily_answers.get(date)
+        puzzle = daily_store.get(date)
+        correct_answers = puzzle["answers"] if puzzle else None
         
         if not correct_answers:
             raise HTTPException(
@@ -461,6 +459,11 @@ async def reveal_answers(date: Optional[str] = None):
 async def health_check():
     return {"status": "healthy", "service": "crossword-generator"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """LLM provider latency: connection setup (connect/TLS) vs. time waiting on the model"""
+    return {"llm": LLMService.metrics.snapshot(), "llm_cache": LLMService.cache.stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -1,11 +1,23 @@
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+import os
 from src.models import Direction, WordPlacement, CrosswordGrid
+from src.grid import CompactGrid, LetterIndex, encode_word, decode_word, run_bounds
 import random
+import time
+
+# Generation engines selectable through the API
+ENGINES = ("greedy", "search", "multiseed")
+# Engine used when a request doesn't pick one
+DEFAULT_ENGINE = os.getenv("CROSSWORD_ENGINE", "greedy")
+# Wall-clock budget for the "search" and "multiseed" engines, in milliseconds
+SEARCH_BUDGET_MS = int(os.getenv("CROSSWORD_SEARCH_BUDGET_MS", "2000"))
 
 class CrosswordGenerator:
     def __init__(self, words: List[str], grid_size: int = 15):
         """Initialize with word list and grid size"""
         self.words = [word.upper() for word in words]
+        self.word_set = set(self.words)
+        self._encoded: Dict[str, bytes] = {}
         self.grid_size = grid_size
         self.max_unintended_words = max(1, len(words) // 5)  # 1 unintended word per 5 intended
         self.debug_mode = False  # Set to True for debugging output
@@ -20,66 +32,63 @@ class CrosswordGenerator:
                     intersections.append((i, j))
         return intersections
     
-    def can_place_word(self, grid: List[List[Optional[str]]], word: str, 
+    def _codes(self, word: str) -> bytes:
+        """Encoded letters of word, cached per generator"""
+        codes = self._encoded.get(word)
+        if codes is None:
+            codes = self._encoded[word] = encode_word(word)
+        return codes
+    
+    def can_place_word(self, grid: CompactGrid, word: str, 
                       start_row: int, start_col: int, direction: Direction, 
                       word_placements: List[WordPlacement] = None) -> bool:
         """Check if word can be placed at given position without conflicts"""
         # Check bounds
-        if direction == Direction.HORIZONTAL:
-            if start_col + len(word) > self.grid_size or start_row >= self.grid_size:
-                return False
-            if start_row < 0 or start_col < 0:
-                return False
-        else:  # VERTICAL
-            if start_row + len(word) > self.grid_size or start_col >= self.grid_size:
-                return False
-            if start_row < 0 or start_col < 0:
-                return False
+        if not grid.fits(start_row, start_col, len(word), direction):
+            return False
         
-        # Check for conflicts
-        for i, letter in enumerate(word):
-            if direction == Direction.HORIZONTAL:
-                row, col = start_row, start_col + i
-            else:
-                row, col = start_row + i, start_col
-            
-            if grid[row][col] is not None and grid[row][col] != letter:
-                return False
+        # Check for conflicts - only cells that are already filled need comparing
+        occupied = grid.line_mask(start_row, start_col, len(word), direction)
+        if occupied:
+            codes = self._codes(word)
+            existing = grid.line_codes(start_row, start_col, len(word), direction)
+            bits = occupied
+            while bits:
+                low = bits & -bits
+                i = low.bit_length() - 1
+                bits ^= low
+                if existing[i] != codes[i]:
+                    return False
         
         # Check perpendicular word formation if we have existing placements
         if word_placements and len(word_placements) > 0:
-            if not self._is_valid_perpendicular_placement(grid, word, start_row, start_col, direction):
+            # Ensure connectivity (word must intersect with existing words)
+            if not occupied:
                 return False
             
             # Check for word boundary violations (merging words)
             if not self._check_word_boundaries(grid, word, start_row, start_col, direction):
                 return False
             
-            # Ensure connectivity (word must intersect with existing words)
-            if not self._is_connected_to_existing(grid, word, start_row, start_col, direction):
+            if not self._is_valid_perpendicular_placement(grid, word, start_row, start_col, direction):
                 return False
         
         return True
     
-    def place_word(self, grid: List[List[Optional[str]]], word: str,
+    def place_word(self, grid: CompactGrid, word: str,
                   start_row: int, start_col: int, direction: Direction) -> bool:
         """Place word on grid if possible, return success status"""
         if not self.can_place_word(grid, word, start_row, start_col, direction):
             return False
         
-        for i, letter in enumerate(word):
-            if direction == Direction.HORIZONTAL:
-                row, col = start_row, start_col + i
-            else:
-                row, col = start_row + i, start_col
-            grid[row][col] = letter
-        
+        grid.place(self._codes(word), start_row, start_col, direction)
         return True
     
     def generate_crossword(self) -> CrosswordGrid:
         """Main algorithm to generate crossword puzzle"""
-        grid = [[None for _ in range(self.grid_size)] for _ in range(self.grid_size)]
-        word_placements = []
+        grid = CompactGrid(self.grid_size)
+        index = LetterIndex()
+        word_placements = index.placements
         
         # Place first word in center horizontally
         first_word = self.words[0]
@@ -87,7 +96,7 @@ class CrosswordGenerator:
         start_col = (self.grid_size - len(first_word)) // 2
         
         if self.place_word(grid, first_word, start_row, start_col, Direction.HORIZONTAL):
-            word_placements.append(WordPlacement(
+            index.add(WordPlacement(
                 word=first_word,
                 start_row=start_row,
                 start_col=start_col,
@@ -96,49 +105,208 @@ class CrosswordGenerator:
         
         # Try to place remaining words
         for word in self.words[1:]:
-            placed = False
-            
-            # Try to intersect with existing words
-            for placed_word in word_placements:
-                intersections = self.find_intersections(word, placed_word.word)
-                
-                for word_idx, placed_idx in intersections:
-                    # Calculate position for intersection
-                    if placed_word.direction == Direction.HORIZONTAL:
-                        # Place new word vertically
-                        new_start_row = placed_word.start_row - word_idx
-                        new_start_col = placed_word.start_col + placed_idx
-                        new_direction = Direction.VERTICAL
-                    else:
-                        # Place new word horizontally
-                        new_start_row = placed_word.start_row + placed_idx
-                        new_start_col = placed_word.start_col - word_idx
-                        new_direction = Direction.HORIZONTAL
-                    
-                    if self.can_place_word(grid, word, new_start_row, new_start_col, new_direction, word_placements):
-                        if self.place_word(grid, word, new_start_row, new_start_col, new_direction):
-                            word_placements.append(WordPlacement(
-                                word=word,
-                                start_row=new_start_row,
-                                start_col=new_start_col,
-                                direction=new_direction
-                            ))
-                            placed = True
-                            break
-                
-                if placed:
-                    break
+            # Try to intersect with existing words, using the letter index to find
+            # every shared letter instead of scanning each placed word
+            for new_start_row, new_start_col, new_direction in index.anchors(word):
+                if self.can_place_word(grid, word, new_start_row, new_start_col, new_direction, word_placements):
+                    if self.place_word(grid, word, new_start_row, new_start_col, new_direction):
+                        index.add(WordPlacement(
+                            word=word,
+                            start_row=new_start_row,
+                            start_col=new_start_col,
+                            direction=new_direction
+                        ))
+                        break
             
             # Skip words that can't be connected (removed random fallback)
             # All words must be connected to maintain crossword integrity
         
         return CrosswordGrid(
-            grid=grid,
+            grid=grid.to_lists(),
             width=self.grid_size,
             height=self.grid_size,
             word_placements=word_placements
         )
-    
+
+    def generate(self, engine: str = "greedy", time_budget_ms: Optional[int] = None,
+                 seed: int = 0) -> CrosswordGrid:
+        """Generate a crossword with the named engine ("greedy", "search" or "multiseed").
+        seed only affects "multiseed", which picks the best of many seeded word orders."""
+        if engine == "greedy":
+            return self.generate_crossword()
+        if engine == "search":
+            if time_budget_ms is None:
+                return self.generate_crossword_search()
+            return self.generate_crossword_search(time_budget_ms=time_budget_ms)
+        if engine == "multiseed":
+            # Imported here: multi_seed builds on this module
+            from src.multi_seed import generate_best_of_n
+            if time_budget_ms is None:
+                return generate_best_of_n(self.words, self.grid_size, seed)
+            return generate_best_of_n(self.words, self.grid_size, seed, deadline_ms=time_budget_ms)
+        raise ValueError(f"Unknown engine '{engine}'. Choose one of: {', '.join(ENGINES)}")
+
+    def generate_crossword_search(self, time_budget_ms: int = 2000, max_iterations: int = 50000,
+                                  beam_width: int = 3) -> CrosswordGrid:
+        """Backtracking search over candidate placements within a time/iteration budget.
+
+        At each step the unplaced word with the fewest valid placements is tried next
+        (most-constrained first), branching over its `beam_width` best placements and
+        over leaving it out.
+        Returns the densest grid found (most words, then most crossings), and never
+        does worse than the greedy pass, which seeds the search."""
+        deadline = time.perf_counter() + time_budget_ms / 1000.0
+
+        greedy = self.generate_crossword()
+        best = {
+            "score": self._placement_score(greedy.word_placements),
+            "grid": greedy.grid,
+            "placements": greedy.word_placements,
+        }
+        if len(greedy.word_placements) == len(self.words):
+            return greedy
+
+        grid = CompactGrid(self.grid_size)
+        index = LetterIndex()
+        word_placements = index.placements
+        remaining = self._order_words_for_search()
+        iterations = 0
+
+        def record_if_better():
+            score = self._placement_score(word_placements)
+            if score > best["score"]:
+                best["score"] = score
+                best["grid"] = grid.to_lists()
+                best["placements"] = list(word_placements)
+
+        def search() -> bool:
+            """Returns True when the search should stop (budget spent or all words placed)"""
+            nonlocal iterations
+            iterations += 1
+            record_if_better()
+
+            if best["score"][0] == len(self.words):
+                return True
+            if iterations >= max_iterations or time.perf_counter() >= deadline:
+                return True
+            # Even placing every remaining word cannot beat the best word count
+            if len(word_placements) + len(remaining) < best["score"][0]:
+                return False
+
+            # Most-constrained word first; words with no placement yet may fit later
+            chosen = None
+            for position, word_index in enumerate(remaining):
+                candidates = self._candidate_placements(grid, self.words[word_index], index)
+                if candidates and (chosen is None or len(candidates) < len(chosen[2])):
+                    chosen = (position, word_index, candidates)
+                    if len(candidates) == 1:
+                        break
+            if chosen is None:
+                return False
+
+            position, word_index, candidates = chosen
+            word = self.words[word_index]
+            remaining.pop(position)
+            for start_row, start_col, direction in candidates[:beam_width]:
+                filled = grid.place(self._codes(word), start_row, start_col, direction)
+                index.add(WordPlacement(
+                    word=word,
+                    start_row=start_row,
+                    start_col=start_col,
+                    direction=direction
+                ))
+                stop = search()
+                index.pop()
+                grid.remove(start_row, start_col, direction, filled)
+                if stop:
+                    break
+            if not stop:
+                # Also try leaving this word out, in case it blocks better placements
+                stop = search()
+            remaining.insert(position, word_index)
+            return stop
+
+        # Centre the first word horizontally, as the greedy pass does
+        first_index = remaining.pop(0)
+        first_word = self.words[first_index]
+        start_row = self.grid_size // 2
+        start_col = (self.grid_size - len(first_word)) // 2
+        if self.can_place_word(grid, first_word, start_row, start_col, Direction.HORIZONTAL):
+            grid.place(self._codes(first_word), start_row, start_col, Direction.HORIZONTAL)
+            index.add(WordPlacement(
+                word=first_word,
+                start_row=start_row,
+                start_col=start_col,
+                direction=Direction.HORIZONTAL
+            ))
+            search()
+
+        if self.debug_mode:
+            print(f"Search finished after {iterations} iterations: {best['score'][0]}/{len(self.words)} words, {best['score'][1]} crossings")
+
+        return CrosswordGrid(
+            grid=best["grid"],
+            width=self.grid_size,
+            height=self.grid_size,
+            word_placements=best["placements"]
+        )
+
+    def _order_words_for_search(self) -> List[int]:
+        """Order word indices so well-connected, long words are placed first"""
+        letter_counts = {}
+        for word in self.words:
+            for letter in set(word):
+                letter_counts[letter] = letter_counts.get(letter, 0) + 1
+
+        def connectivity(index: int) -> int:
+            return sum(letter_counts[letter] - 1 for letter in set(self.words[index]))
+
+        return sorted(range(len(self.words)),
+                      key=lambda i: (connectivity(i), len(self.words[i])), reverse=True)
+
+    def _candidate_placements(self, grid: CompactGrid, word: str,
+                              index: LetterIndex) -> List[Tuple[int, int, Direction]]:
+        """All valid positions crossing an already placed word, best first.
+        Positions that cross more existing letters and sit nearer the centre rank higher."""
+        seen = set()
+        scored = []
+        centre = (self.grid_size - 1) / 2
+
+        for candidate in index.anchors(word):
+            if candidate in seen:
+                continue
+            seen.add(candidate)
+
+            start_row, start_col, direction = candidate
+            if not self.can_place_word(grid, word, start_row, start_col, direction, index.placements):
+                continue
+
+            crossings = grid.line_mask(start_row, start_col, len(word), direction).bit_count()
+
+            if direction == Direction.HORIZONTAL:
+                mid_row, mid_col = start_row, start_col + (len(word) - 1) / 2
+            else:
+                mid_row, mid_col = start_row + (len(word) - 1) / 2, start_col
+            distance = abs(mid_row - centre) + abs(mid_col - centre)
+            scored.append((-crossings, distance, candidate))
+
+        scored.sort(key=lambda item: (item[0], item[1]))
+        return [candidate for _, _, candidate in scored]
+
+    @staticmethod
+    def _placement_score(word_placements: List[WordPlacement]) -> Tuple[int, int]:
+        """(words placed, crossing cells) - higher is denser"""
+        cells = set()
+        letters = 0
+        for placement in word_placements:
+            for i in range(len(placement.word)):
+                if placement.direction == Direction.HORIZONTAL:
+                    cells.add((placement.start_row, placement.start_col + i))
+                else:
+                    cells.add((placement.start_row + i, placement.start_col))
+            letters += len(placement.word)
+        return (len(word_placements), letters - len(cells))
+
     def print_grid(self, grid: CrosswordGrid) -> str:
         """Return string representation of grid for debugging"""
         output = []
@@ -210,75 +378,54 @@ class CrosswordGenerator:
         
         return intersections
     
-    def _extract_perpendicular_words(self, grid: List[List[Optional[str]]], 
+    def _extract_perpendicular_words(self, grid: CompactGrid, 
                                    word: str, start_row: int, start_col: int, 
                                    direction: Direction) -> List[str]:
         """Extract all words that would be formed perpendicular to the placed word"""
         perpendicular_words = []
+        codes = self._codes(word)
+        seg = ((1 << len(word)) - 1)
         
-        # Create a test grid with the word placed
-        test_grid = [row[:] for row in grid]  # Deep copy
-        for i in range(len(word)):
-            if direction == Direction.HORIZONTAL:
-                test_grid[start_row][start_col + i] = word[i]
-            else:
-                test_grid[start_row + i][start_col] = word[i]
+        if direction == Direction.HORIZONTAL:
+            # Only columns with a letter directly above or below can form a vertical word
+            neighbours = 0
+            if start_row > 0:
+                neighbours |= grid.row_masks[start_row - 1]
+            if start_row < self.grid_size - 1:
+                neighbours |= grid.row_masks[start_row + 1]
+            bits = (neighbours >> start_col) & seg
+        else:  # VERTICAL placement
+            # Only rows with a letter directly left or right can form a horizontal word
+            neighbours = 0
+            if start_col > 0:
+                neighbours |= grid.col_masks[start_col - 1]
+            if start_col < self.grid_size - 1:
+                neighbours |= grid.col_masks[start_col + 1]
+            bits = (neighbours >> start_row) & seg
         
-        # Check each letter position for perpendicular word formation
-        for i in range(len(word)):
+        while bits:
+            low = bits & -bits
+            i = low.bit_length() - 1
+            bits ^= low
+            
             if direction == Direction.HORIZONTAL:
-                # Check vertical words at each column
+                # Vertical run through (start_row, col) once the letter is in place
                 col = start_col + i
-                
-                # Find start of any vertical word containing this position
-                word_start_row = start_row
-                while (word_start_row > 0 and 
-                       test_grid[word_start_row - 1][col] is not None):
-                    word_start_row -= 1
-                
-                # Find end of vertical word
-                word_end_row = start_row
-                while (word_end_row < self.grid_size - 1 and 
-                       test_grid[word_end_row + 1][col] is not None):
-                    word_end_row += 1
-                
-                # Build the vertical word if it's longer than 1 character
-                if word_end_row > word_start_row:
-                    vertical_word = ""
-                    for row in range(word_start_row, word_end_row + 1):
-                        vertical_word += test_grid[row][col]
-                    
-                    if len(vertical_word) > 1:
-                        perpendicular_words.append(vertical_word)
-            
-            else:  # VERTICAL placement
-                # Check horizontal words at each row
+                run_start, run_end = run_bounds(grid.col_masks[col], start_row)
+                run = bytearray(grid.line_codes(run_start, col, run_end - run_start + 1, Direction.VERTICAL))
+                run[start_row - run_start] = codes[i]
+            else:
+                # Horizontal run through (row, start_col) once the letter is in place
                 row = start_row + i
-                
-                # Find start of any horizontal word containing this position
-                word_start_col = start_col
-                while (word_start_col > 0 and 
-                       test_grid[row][word_start_col - 1] is not None):
-                    word_start_col -= 1
-                
-                # Find end of horizontal word
-                word_end_col = start_col
-                while (word_end_col < self.grid_size - 1 and 
-                       test_grid[row][word_end_col + 1] is not None):
-                    word_end_col += 1
-                
-                # Build the horizontal word if it's longer than 1 character
-                if word_end_col > word_start_col:
-                    horizontal_word = ""
-                    for col in range(word_start_col, word_end_col + 1):
-                        horizontal_word += test_grid[row][col]
-                    
-                    if len(horizontal_word) > 1:
-                        perpendicular_words.append(horizontal_word)
+                run_start, run_end = run_bounds(grid.row_masks[row], start_col)
+                run = bytearray(grid.line_codes(row, run_start, run_end - run_start + 1, Direction.HORIZONTAL))
+                run[start_col - run_start] = codes[i]
+            
+            perpendicular_words.append(decode_word(run))
         
         return perpendicular_words
     
-    def _is_valid_perpendicular_placement(self, grid: List[List[Optional[str]]], 
+    def _is_valid_perpendicular_placement(self, grid: CompactGrid, 
                                         word: str, start_row: int, start_col: int, 
                                         direction: Direction) -> bool:
         """Check if placing word creates valid perpendicular words"""
@@ -289,55 +436,33 @@ class CrosswordGenerator:
         
         unintended_words = []
         for perp_word in unique_perpendicular_words:
-            if perp_word not in self.words:
+            if perp_word not in self.word_set:
                 unintended_words.append(perp_word)
         
         # Debug output for testing
-        if unintended_words:
+        if unintended_words and self.debug_mode:
             print(f"Placing '{word}' would create unintended words: {unintended_words}")
         
         # For now, require ALL perpendicular words to be valid (strict mode)
         return len(unintended_words) == 0
     
-    def _is_connected_to_existing(self, grid: List[List[Optional[str]]], 
-                                word: str, start_row: int, start_col: int, 
-                                direction: Direction) -> bool:
-        """Check if word connects to existing letters on the grid"""
-        for i in range(len(word)):
-            if direction == Direction.HORIZONTAL:
-                row, col = start_row, start_col + i
-            else:
-                row, col = start_row + i, start_col
-            
-            # If any position already has a letter, we're connecting
-            if grid[row][col] is not None:
-                return True
-        
-        return False
-    
-    def _check_word_boundaries(self, grid: List[List[Optional[str]]], 
+    def _check_word_boundaries(self, grid: CompactGrid, 
                              word: str, start_row: int, start_col: int, 
                              direction: Direction) -> bool:
         """Check that placing word doesn't merge with adjacent words"""
         
         if direction == Direction.HORIZONTAL:
-            # Check before the word starts
-            if start_col > 0 and grid[start_row][start_col - 1] is not None:
-                return False
-            
-            # Check after the word ends
-            end_col = start_col + len(word) - 1
-            if end_col < self.grid_size - 1 and grid[start_row][end_col + 1] is not None:
-                return False
-                
+            line = grid.row_masks[start_row]
+            start = start_col
         else:  # VERTICAL
-            # Check before the word starts
-            if start_row > 0 and grid[start_row - 1][start_col] is not None:
-                return False
-            
-            # Check after the word ends
-            end_row = start_row + len(word) - 1
-            if end_row < self.grid_size - 1 and grid[end_row + 1][start_col] is not None:
-                return False
+            line = grid.col_masks[start_col]
+            start = start_row
         
-        return True
\ No newline at end of file
+        # Check the cells just before the word starts and just after it ends
+        end = start + len(word) - 1
+        if start > 0 and (line >> (start - 1)) & 1:
+            return False
+        if end < self.grid_size - 1 and (line >> (end + 1)) & 1:
+            return False
+        
+        return True
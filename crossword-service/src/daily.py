@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from starlette.concurrency import run_in_threadpool
+from src.crossword_generator import CrosswordGenerator, DEFAULT_ENGINE, SEARCH_BUDGET_MS
+from src.daily_store import DailyStore
+from src.llm_service import LLMService
+from src.models import Direction
+from src.multi_seed import seed_from_text
+from src.single_flight import SingleFlight
+
+DAILY_TIMEZONE = ZoneInfo("America/New_York")
+# How many past days a missing puzzle may still be generated for on request
+DAILY_BACKFILL_DAYS = int(os.getenv("DAILY_BACKFILL_DAYS", "7"))
+
+# One generation per date at a time, shared by /daily requests and pre-generation
+daily_generation = SingleFlight()
+
+# Daily themes (matching the Node.js version)
+DAILY_THEMES = [
+    {"topic": "Daniel Caesar", "type": "artist"},
+    {"topic": "SZA", "type": "artist"},
+    {"topic": "Drake", "type": "artist"},
+    {"topic": "Beyoncé", "type": "artist"},
+    {"topic": "90s Hip Hop", "type": "era"},
+    {"topic": "80s Rock", "type": "era"},
+    {"topic": "Classic Rock", "type": "era"},
+    {"topic": "Pop Music", "type": "genre"},
+    {"topic": "Hip Hop", "type": "genre"},
+    {"topic": "R&B", "type": "genre"},
+]
+
+def get_daily_theme(date_str: str) -> Dict[str, str]:
+    """Get theme for a specific date"""
+    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+    date_num = date_obj.day
+    return DAILY_THEMES[date_num % len(DAILY_THEMES)]
+
+def today() -> str:
+    """Today's date in the daily puzzle timezone (US Eastern)"""
+    return datetime.now(DAILY_TIMEZONE).strftime("%Y-%m-%d")
+
+def in_generation_window(date: str, ahead_days: int) -> bool:
+    """Whether a missing puzzle for date may be generated on request: from
+    DAILY_BACKFILL_DAYS before today up to ahead_days after it"""
+    offset = (datetime.strptime(date, "%Y-%m-%d") - datetime.strptime(today(), "%Y-%m-%d")).days
+    return -DAILY_BACKFILL_DAYS <= offset <= ahead_days
+
+def seconds_until_rollover() -> int:
+    """Seconds until the next daily puzzle goes live (midnight Eastern)"""
+    now = datetime.now(DAILY_TIMEZONE)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=DAILY_TIMEZONE)
+    return max(1, int((midnight - now).total_seconds()))
+
+async def build_daily_puzzle(date: str, engine: str = DEFAULT_ENGINE,
+                             time_budget_ms: int = SEARCH_BUDGET_MS) -> Tuple[Dict, Dict[str, str]]:
+    """Generate the puzzle for a date.
+    Returns (public payload served by /daily, answers keyed by clue ID)"""
+    theme = get_daily_theme(date)
+    topic = theme["topic"]
+    
+    # Generate words and clues from topic. Daily puzzles are stored for good, so a failed
+    # provider must not be papered over with mock data - fail and let the next request or
+    # pre-generation pass retry (LLM_PROVIDER=mock still gets its deterministic mock puzzle)
+    word_clue_data = await LLMService.generate_words_and_clues_from_topic(topic, mock_fallback=False)
+    words = [item['word'].upper() for item in word_clue_data]
+    clue_mapping = {item['word'].upper(): item['clue'] for item in word_clue_data}
+    
+    # Generate crossword
+    generator = CrosswordGenerator(words, grid_size=15)
+    # Seeded by date so a given day always lays out the same way
+    crossword = await run_in_threadpool(generator.generate, engine, time_budget_ms, seed_from_text(date))
+    
+    if len(crossword.word_placements) < 2:
+        raise ValueError("Could not generate valid crossword")
+    
+    # Convert to our format
+    # Create grid with clue IDs (like "1A", "2D")
+    grid_size = crossword.width
+    grid = [['X' for _ in range(grid_size)] for _ in range(grid_size)]
+    positions = {}
+    clues = {}
+    
+    # Assign numbers to starting positions
+    sorted_placements = sorted(crossword.word_placements, 
+                             key=lambda p: (p.start_row, p.start_col))
+    position_numbers = {}
+    number = 1
+    for placement in sorted_placements:
+        pos_key = (placement.start_row, placement.start_col)
+        if pos_key not in position_numbers:
+            position_numbers[pos_key] = number
+            number += 1
+    
+    # First pass: assign clue IDs to starting positions
+    clue_id_map = {}  # maps (start_row, start_col, direction) to clue_id
+    for placement in crossword.word_placements:
+        pos_key = (placement.start_row, placement.start_col)
+        clue_num = position_numbers[pos_key]
+        direction_code = "A" if placement.direction == Direction.HORIZONTAL else "D"
+        clue_id = f"{clue_num}{direction_code}"
+        clue_id_map[(placement.start_row, placement.start_col, placement.direction)] = clue_id
+    
+    # Second pass: fill grid with clue IDs and build positions/clues/answers
+    # For intersections, store both clue IDs separated by "/"
+    answers = {}  # Store correct answers for this puzzle
+    
+    for placement in crossword.word_placements:
+        clue_id = clue_id_map[(placement.start_row, placement.start_col, placement.direction)]
+        
+        # Place clue ID in all cells of this word
+        for i in range(len(placement.word)):
+            if placement.direction == Direction.HORIZONTAL:
+                row, col = placement.start_row, placement.start_col + i
+            else:
+                row, col = placement.start_row + i, placement.start_col
+            
+            # Handle intersections by storing both clue IDs
+            if grid[row][col] == 'X':
+                grid[row][col] = clue_id
+            elif grid[row][col] != clue_id:
+                # This is an intersection - store both IDs
+                existing = grid[row][col]
+                # Make sure we don't duplicate
+                if '/' not in existing:
+                    grid[row][col] = f"{existing}/{clue_id}"
+        
+        print(f"📍 Word {clue_id}: {placement.word} at ({placement.start_row},{placement.start_col}) {placement.direction.value}")
+        
+        # Store position (only once per clue_id)
+        if clue_id not in positions:
+            positions[clue_id] = {
+                "row": placement.start_row,
+                "col": placement.start_col,
+                "direction": placement.direction.value,
+                "length": len(placement.word)
+            }
+        
+        # Store clue (only once per clue_id)
+        if clue_id not in clues:
+            word_upper = placement.word.upper()
+            clue_text = clue_mapping.get(word_upper, f"{theme['topic']}-related term")
+            clues[clue_id] = {
+                "clue": clue_text,
+                "length": len(placement.word)
+            }
+        
+        # Store answer (only once per clue_id)
+        if clue_id not in answers:
+            answers[clue_id] = placement.word.upper()
+    
+    return {
+        "date": date,
+        "template": {
+            "grid": grid,
+            "positions": positions
+        },
+        "clues": clues,
+        "theme": theme
+    }, answers
+
+async def get_or_create_daily(store: DailyStore, date: str, engine: str = DEFAULT_ENGINE) -> Dict:
+    """Stored puzzle for date, generating it if needed.
+    Concurrent callers for the same date share a single generation."""
+    puzzle = store.get(date)
+    if puzzle is not None:
+        return puzzle
+
+    async def generate() -> Dict:
+        # Another caller may have stored it while we were waiting to start
+        stored = store.get(date)
+        if stored is not None:
+            return stored
+        payload, answers = await build_daily_puzzle(date, engine)
+        return store.put(date, payload, answers)
+
+    return await daily_generation.do(date, generate)
+
+async def pregenerate_daily(store: DailyStore, days: int, start: Optional[str] = None,
+                            engine: str = DEFAULT_ENGINE) -> List[str]:
+    """Generate and store puzzles for the next `days` days that aren't stored yet.
+    Returns the dates that were generated."""
+    start_date = datetime.strptime(start or today(), "%Y-%m-%d")
+    generated = []
+    for offset in range(days):
+        date = (start_date + timedelta(days=offset)).strftime("%Y-%m-%d")
+        if store.has(date):
+            continue
+        try:
+            puzzle = await get_or_create_daily(store, date, engine)
+            generated.append(date)
+            print(f"🗓️  Pre-generated daily crossword for {date} ({puzzle['payload']['theme']['topic']})")
+        except Exception as e:
+            print(f"Error pre-generating daily crossword for {date}: {e}")
+    return generated
+
+if __name__ == "__main__":
+    # python -m src.daily --days 7
+    from dotenv import load_dotenv
+    load_dotenv()
+    
+    parser = argparse.ArgumentParser(description="Pre-generate daily crosswords")
+    parser.add_argument("--days", type=int, default=7, help="number of days to generate, starting at --start")
+    parser.add_argument("--start", help="first date (YYYY-MM-DD), defaults to today (US Eastern)")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE, help="generation engine")
+    args = parser.parse_args()
+    
+    dates = asyncio.run(pregenerate_daily(DailyStore(), args.days, args.start, args.engine))
+    print(f"Generated {len(dates)} puzzle(s): {', '.join(dates) or 'none needed'}")
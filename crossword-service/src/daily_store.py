@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# SQLite file holding generated daily puzzles. Point every replica at the same
+# file (shared volume) so they all serve the same puzzle for a given date.
+DAILY_STORE_PATH = os.getenv("DAILY_STORE_PATH", "data/daily_puzzles.db")
+
+
+class DailyStore:
+    """Durable store of generated daily puzzles, keyed by date (YYYY-MM-DD).
+
+    Each record keeps the public puzzle payload, the answers used by /check and
+    /reveal, and an ETag of the payload. The first puzzle written for a date
+    wins; later writes for the same date are ignored."""
+
+    def __init__(self, path: str = DAILY_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS daily_puzzles (
+                    date TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    answers TEXT NOT NULL,
+                    etag TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, date: str) -> Optional[Dict]:
+        """Return {"date", "payload", "answers", "etag"} for date, or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload, answers, etag FROM daily_puzzles WHERE date = ?", (date,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "date": date,
+            "payload": json.loads(row[0]),
+            "answers": json.loads(row[1]),
+            "etag": row[2],
+        }
+
+    def put(self, date: str, payload: Dict, answers: Dict[str, str]) -> Dict:
+        """Store a puzzle unless one already exists for date; return the stored record"""
+        payload_json = json.dumps(payload, sort_keys=True)
+        etag = '"' + hashlib.sha256(payload_json.encode("utf-8")).hexdigest()[:32] + '"'
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO daily_puzzles (date, payload, answers, etag, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (date, payload_json, json.dumps(answers), etag, datetime.now(timezone.utc).isoformat()),
+            )
+        return self.get(date)
+
+    def has(self, date: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM daily_puzzles WHERE date = ?", (date,)).fetchone()
+        return row is not None
@@ -0,0 +1,174 @@
+from typing import Dict, List, Optional, Tuple
+from src.models import Direction, WordPlacement
+
+# Letters are stored as small integer codes so a grid fits in a flat uint8 array.
+# Code 0 means "empty"; codes are assigned on first use and shared process-wide.
+_LETTER_CODES: Dict[str, int] = {}
+_CODE_LETTERS: List[Optional[str]] = [None]
+
+
+def encode_word(word: str) -> bytes:
+    """Encode a word as letter codes (one byte per letter)"""
+    codes = bytearray()
+    for letter in word:
+        code = _LETTER_CODES.get(letter)
+        if code is None:
+            if len(_CODE_LETTERS) > 255:
+                raise ValueError(f"Too many distinct letters to encode '{letter}'")
+            code = len(_CODE_LETTERS)
+            _LETTER_CODES[letter] = code
+            _CODE_LETTERS.append(letter)
+        codes.append(code)
+    return bytes(codes)
+
+
+def decode_word(codes: bytes) -> str:
+    """Decode letter codes back into a word"""
+    return "".join(_CODE_LETTERS[code] for code in codes)
+
+
+def run_bounds(mask: int, index: int) -> Tuple[int, int]:
+    """Return (start, end) of the run of set bits in mask containing bit index"""
+    mask |= 1 << index
+    # Highest clear bit below index marks the cell before the run
+    below = ~mask & ((1 << index) - 1)
+    start = below.bit_length()
+    # Trailing ones from index upwards give the run length
+    above = mask >> index
+    length = (~above & (above + 1)).bit_length() - 1
+    return start, index + length - 1
+
+
+class CompactGrid:
+    """Square crossword grid backed by a flat uint8 letter array plus occupancy
+    bitmasks per row and per column (bit i of row_masks[r] is cell (r, i)).
+
+    Placement checks work on whole-line slices and bit operations instead of
+    walking cells, and placements can be undone without copying the grid."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.letters = bytearray(size * size)
+        self.row_masks = [0] * size
+        self.col_masks = [0] * size
+
+    def fits(self, start_row: int, start_col: int, length: int, direction: Direction) -> bool:
+        """Check that a word of this length stays inside the grid"""
+        if start_row < 0 or start_col < 0:
+            return False
+        if direction == Direction.HORIZONTAL:
+            return start_row < self.size and start_col + length <= self.size
+        return start_col < self.size and start_row + length <= self.size
+
+    def line_mask(self, start_row: int, start_col: int, length: int, direction: Direction) -> int:
+        """Occupancy of the word's cells: bit i is set if letter i lands on a filled cell"""
+        full = (1 << length) - 1
+        if direction == Direction.HORIZONTAL:
+            return (self.row_masks[start_row] >> start_col) & full
+        return (self.col_masks[start_col] >> start_row) & full
+
+    def line_codes(self, start_row: int, start_col: int, length: int, direction: Direction) -> bytes:
+        """Letter codes currently under the word's cells (0 for empty)"""
+        start = start_row * self.size + start_col
+        if direction == Direction.HORIZONTAL:
+            return bytes(self.letters[start:start + length])
+        return bytes(self.letters[start:start + length * self.size:self.size])
+
+    def place(self, codes: bytes, start_row: int, start_col: int, direction: Direction) -> int:
+        """Write encoded word onto the grid.
+        Returns the mask of newly filled cells (bit i = letter i) for remove()."""
+        length = len(codes)
+        filled = ~self.line_mask(start_row, start_col, length, direction) & ((1 << length) - 1)
+        step = 1 if direction == Direction.HORIZONTAL else self.size
+        base = start_row * self.size + start_col
+        bits = filled
+        while bits:
+            low = bits & -bits
+            i = low.bit_length() - 1
+            bits ^= low
+            self.letters[base + i * step] = codes[i]
+            if direction == Direction.HORIZONTAL:
+                self.col_masks[start_col + i] |= 1 << start_row
+            else:
+                self.row_masks[start_row + i] |= 1 << start_col
+        if direction == Direction.HORIZONTAL:
+            self.row_masks[start_row] |= filled << start_col
+        else:
+            self.col_masks[start_col] |= filled << start_row
+        return filled
+
+    def remove(self, start_row: int, start_col: int, direction: Direction, filled: int):
+        """Undo a place() call, clearing only the cells it filled"""
+        step = 1 if direction == Direction.HORIZONTAL else self.size
+        base = start_row * self.size + start_col
+        bits = filled
+        while bits:
+            low = bits & -bits
+            i = low.bit_length() - 1
+            bits ^= low
+            self.letters[base + i * step] = 0
+            if direction == Direction.HORIZONTAL:
+                self.col_masks[start_col + i] &= ~(1 << start_row)
+            else:
+                self.row_masks[start_row + i] &= ~(1 << start_col)
+        if direction == Direction.HORIZONTAL:
+            self.row_masks[start_row] &= ~(filled << start_col)
+        else:
+            self.col_masks[start_col] &= ~(filled << start_row)
+
+    def to_lists(self) -> List[List[Optional[str]]]:
+        """Serialize to the list-of-lists form used by CrosswordGrid.grid"""
+        return [
+            [_CODE_LETTERS[code] for code in self.letters[row * self.size:(row + 1) * self.size]]
+            for row in range(self.size)
+        ]
+
+
+class LetterIndex:
+    """Index from letter to every place that letter sits in a placed word.
+
+    Entries are (placement order, offset, row, col, direction of the placed word).
+    Words are added as they land and removed in reverse order when the search
+    backtracks, so each letter's list stays in placement order."""
+
+    def __init__(self):
+        self.placements: List[WordPlacement] = []
+        self._positions: Dict[str, List[Tuple[int, int, int, int, Direction]]] = {}
+
+    def add(self, placement: WordPlacement):
+        order = len(self.placements)
+        self.placements.append(placement)
+        for offset, letter in enumerate(placement.word):
+            if placement.direction == Direction.HORIZONTAL:
+                row, col = placement.start_row, placement.start_col + offset
+            else:
+                row, col = placement.start_row + offset, placement.start_col
+            self._positions.setdefault(letter, []).append((order, offset, row, col, placement.direction))
+
+    def pop(self) -> WordPlacement:
+        """Remove the most recently added placement"""
+        placement = self.placements.pop()
+        for letter in placement.word:
+            self._positions[letter].pop()
+        return placement
+
+    def anchors(self, word: str) -> List[Tuple[int, int, Direction]]:
+        """Start positions where word would cross a placed word on a shared letter.
+
+        Ordered by placed word, then by letter of the new word, then by letter
+        of the placed word - the order a pairwise scan would visit them in."""
+        hits = []
+        for index, letter in enumerate(word):
+            for order, offset, row, col, direction in self._positions.get(letter, ()):
+                hits.append((order, index, offset, row, col, direction))
+        hits.sort(key=lambda hit: (hit[0], hit[1], hit[2]))
+
+        anchors = []
+        for _, index, _, row, col, direction in hits:
+            if direction == Direction.HORIZONTAL:
+                # Cross a horizontal word vertically
+                anchors.append((row - index, col, Direction.VERTICAL))
+            else:
+                # Cross a vertical word horizontally
+                anchors.append((row, col - index, Direction.HORIZONTAL))
+        return anchors
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+WordClues = List[Dict[str, str]]
+
+
+class LLMCache:
+    """Cache of parsed LLM word/clue responses.
+
+    Keys are content hashes of (provider, model, prompt), so a prompt change
+    never serves stale output. An in-memory LRU tier bounded by entry count and
+    bytes sits in front of an optional SQLite tier that survives restarts.
+    Entries expire after ttl_seconds in both tiers."""
+
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 256,
+                 max_bytes: int = 8 * 1024 * 1024, disk_path: Optional[str] = None,
+                 max_disk_entries: int = 5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[float, int, WordClues]]" = OrderedDict()
+        self._memory_bytes = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        if disk_path:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    """CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )"""
+                )
+
+    @staticmethod
+    def from_env() -> "LLMCache":
+        return LLMCache(
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+            disk_path=os.getenv("LLM_CACHE_PATH") or None,
+            max_disk_entries=int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "5000")),
+        )
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{provider}\0{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.disk_path, timeout=10)
+
+    def get(self, key: str) -> Optional[WordClues]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, size, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return value
+            self._drop(key)
+
+        if self.disk_path:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self.counters["disk_hits"] += 1
+                return value
+
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, value: WordClues):
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, value, expires_at)
+        if self.disk_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, time.time()),
+                )
+                # Drop expired rows, then the least recently used beyond the cap
+                conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key NOT IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_disk_entries,),
+                )
+
+    def _remember(self, key: str, value: WordClues, expires_at: float):
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        if key in self._memory:
+            self._drop(key)
+        self._memory[key] = (expires_at, size, value)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            oldest = next(iter(self._memory))
+            self._drop(oldest)
+            self.counters["evictions"] += 1
+
+    def _drop(self, key: str):
+        _, size, _ = self._memory.pop(key)
+        self._memory_bytes -= size
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "entries": len(self._memory),
+            "bytes": self._memory_bytes,
+            "disk": bool(self.disk_path),
+        }
@@ -0,0 +1,117 @@
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+
+class CallTrace:
+    """httpx trace hook that timestamps connection and request events.
+
+    Pass as extensions={"trace": CallTrace()} to split a call into connection
+    setup (TCP + TLS handshake) and time spent waiting on the model."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.events: Dict[str, float] = {}
+
+    async def __call__(self, event_name: str, info: dict):
+        # Request events are prefixed by protocol - drop it so HTTP/1.1 and HTTP/2 match
+        if event_name.startswith(("http11.", "http2.")):
+            event_name = event_name.split(".", 1)[1]
+        self.events[event_name] = time.perf_counter()
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def _span_ms(self, start: str, end: str) -> Optional[float]:
+        if start in self.events and end in self.events:
+            return (self.events[end] - self.events[start]) * 1000
+        return None
+
+    @property
+    def reused_connection(self) -> bool:
+        return "connection.connect_tcp.started" not in self.events
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        end = self.finished or time.perf_counter()
+        return {
+            "connect_ms": self._span_ms("connection.connect_tcp.started", "connection.connect_tcp.complete"),
+            "tls_ms": self._span_ms("connection.start_tls.started", "connection.start_tls.complete"),
+            # From the request being sent to the first response byte: the model's time
+            "wait_ms": self._span_ms("send_request_body.complete", "receive_response_headers.complete"),
+            "total_ms": (end - self.started) * 1000,
+        }
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ProviderMetrics:
+    """Running latency stats for one LLM provider"""
+
+    def __init__(self, window: int = 100):
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.reused_connections = 0
+        self._sums: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self.recent_total_ms: Deque[float] = deque(maxlen=window)
+
+    def record(self, trace: CallTrace, error: bool = False, cancelled: bool = False, streamed: bool = False):
+        """Add one call. Only non-streamed calls that succeeded or were cancelled feed the
+        recent latency window: a cancelled call (usually a primary that lost a hedge race)
+        took at least that long, while a streamed call's time depends on how much was read."""
+        self.calls += 1
+        if error:
+            self.errors += 1
+        if cancelled:
+            self.cancelled += 1
+        if trace.reused_connection:
+            self.reused_connections += 1
+        timings = trace.timings()
+        for name, value in timings.items():
+            if value is None:
+                continue
+            self._sums[name] = self._sums.get(name, 0.0) + value
+            self._counts[name] = self._counts.get(name, 0) + 1
+        if not error and not streamed:
+            self.recent_total_ms.append(timings["total_ms"])
+
+    def latency_percentile(self, fraction: float, min_samples: int = 10) -> Optional[float]:
+        """Percentile of recent call latency (ms), once there are enough samples"""
+        if len(self.recent_total_ms) < min_samples:
+            return None
+        return percentile(list(self.recent_total_ms), fraction)
+
+    def snapshot(self) -> dict:
+        recent = list(self.recent_total_ms)
+        p50, p90 = percentile(recent, 0.5), percentile(recent, 0.9)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "reused_connections": self.reused_connections,
+            "avg_ms": {name: round(self._sums[name] / self._counts[name], 1) for name in self._sums},
+            "p50_total_ms": round(p50, 1) if p50 is not None else None,
+            "p90_total_ms": round(p90, 1) if p90 is not None else None,
+        }
+
+
+class LLMMetrics:
+    """Latency metrics for every provider the service has called"""
+
+    def __init__(self):
+        self.providers: Dict[str, ProviderMetrics] = {}
+
+    def provider(self, name: str) -> ProviderMetrics:
+        if name not in self.providers:
+            self.providers[name] = ProviderMetrics()
+        return self.providers[name]
+
+    def snapshot(self) -> dict:
+        return {name: metrics.snapshot() for name, metrics in self.providers.items()}
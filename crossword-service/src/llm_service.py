@@ -1,21 +1,125 @@
+import asyncio
 import os
 import httpx
 import csv
 import io
-from typing import List, Optional, Dict, Tuple
+from typing import AsyncIterator, List, Optional, Dict, Tuple
 import json
+from contextlib import aclosing
+from src.llm_cache import LLMCache
+from src.llm_metrics import CallTrace, LLMMetrics
+
+try:
+    import h2  # noqa: F401 - HTTP/2 support for httpx is optional
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 class LLMService:
     
+    # One pooled client per provider for the lifetime of the app (see startup/shutdown)
+    _clients: Dict[str, httpx.AsyncClient] = {}
+    metrics = LLMMetrics()
+    cache = LLMCache.from_env()
+    
+    MODELS = {
+        'openai': 'gpt-3.5-turbo',
+        'anthropic': 'claude-3-haiku-20240307',
+        'ollama': 'llama2',
+    }
+    PROVIDER_NAMES = {'openai': 'OpenAI', 'anthropic': 'Anthropic', 'ollama': 'Ollama'}
+    
     @staticmethod
     def get_config():
         return {
             'provider': os.getenv('LLM_PROVIDER', 'mock'),
             'openai_key': os.getenv('OPENAI_API_KEY'),
             'anthropic_key': os.getenv('ANTHROPIC_API_KEY'),
-            'ollama_url': os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+            'ollama_url': os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'),
+            # Secondary provider raced against the primary when it is slow (optional)
+            'hedge_provider': os.getenv('LLM_HEDGE_PROVIDER'),
+            'hedge_after_ms': os.getenv('LLM_HEDGE_AFTER_MS'),
+            'hedge_default_ms': float(os.getenv('LLM_HEDGE_DEFAULT_MS', '10000')),
+            'deadline_ms': float(os.getenv('LLM_DEADLINE_MS', '45000'))
+        }
+    
+    @staticmethod
+    def get_http_config():
+        return {
+            'base_urls': {
+                'openai': 'https://api.openai.com',
+                'anthropic': 'https://api.anthropic.com',
+                'ollama': os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'),
+            },
+            'timeouts': {
+                'openai': float(os.getenv('OPENAI_TIMEOUT', '30')),
+                'anthropic': float(os.getenv('ANTHROPIC_TIMEOUT', '30')),
+                'ollama': float(os.getenv('OLLAMA_TIMEOUT', '60')),
+            },
+            'connect_timeout': float(os.getenv('LLM_CONNECT_TIMEOUT', '5')),
+            'max_connections': int(os.getenv('LLM_MAX_CONNECTIONS', '10')),
+            'max_keepalive_connections': int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '5')),
+            'keepalive_expiry': float(os.getenv('LLM_KEEPALIVE_EXPIRY', '60')),
+            'http2': os.getenv('LLM_HTTP2', 'true').lower() == 'true' and HTTP2_AVAILABLE,
         }
     
+    @staticmethod
+    def _create_client(provider: str) -> httpx.AsyncClient:
+        http_config = LLMService.get_http_config()
+        return httpx.AsyncClient(
+            base_url=http_config['base_urls'][provider],
+            timeout=httpx.Timeout(http_config['timeouts'][provider], connect=http_config['connect_timeout']),
+            limits=httpx.Limits(
+                max_connections=http_config['max_connections'],
+                max_keepalive_connections=http_config['max_keepalive_connections'],
+                keepalive_expiry=http_config['keepalive_expiry'],
+            ),
+            http2=http_config['http2'],
+        )
+    
+    @staticmethod
+    async def startup():
+        """Open the pooled provider clients (called from the app lifespan)"""
+        for provider in ('openai', 'anthropic', 'ollama'):
+            if provider not in LLMService._clients:
+                LLMService._clients[provider] = LLMService._create_client(provider)
+    
+    @staticmethod
+    async def shutdown():
+        """Close the pooled provider clients and their connections"""
+        clients = list(LLMService._clients.values())
+        LLMService._clients.clear()
+        for client in clients:
+            await client.aclose()
+    
+    @staticmethod
+    def get_client(provider: str) -> httpx.AsyncClient:
+        """Pooled client for provider, created on first use outside the app (e.g. scripts)"""
+        client = LLMService._clients.get(provider)
+        if client is None or client.is_closed:
+            client = LLMService._clients[provider] = LLMService._create_client(provider)
+        return client
+    
+    @staticmethod
+    async def _post(provider: str, path: str, **kwargs) -> httpx.Response:
+        """POST through the provider's pooled client, recording connection and model latency"""
+        trace = CallTrace()
+        try:
+            response = await LLMService.get_client(provider).post(path, extensions={'trace': trace}, **kwargs)
+            response.raise_for_status()
+        except asyncio.CancelledError:
+            # Usually a primary that lost a hedge race - its time still counts towards the p90
+            trace.finish()
+            LLMService.metrics.provider(provider).record(trace, cancelled=True)
+            raise
+        except Exception:
+            trace.finish()
+            LLMService.metrics.provider(provider).record(trace, error=True)
+            raise
+        trace.finish()
+        LLMService.metrics.provider(provider).record(trace)
+        return response
+    
     @staticmethod
     def create_prompt(topic: str) -> str:
         return f"""You are creating crossword clues in the style of The New York Times crosswords. Generate exactly 30 words with clues related to the topic "{topic}".
@@ -68,91 +172,332 @@ Now generate 30 word-clue pairs for the topic: "{topic}". Make them clever, witt
         return [item['word'] for item in word_clue_data]
     
     @staticmethod
-    async def generate_words_and_clues_from_topic(topic: str) -> List[Dict[str, str]]:
-        """New method that returns both words and clues"""
+    async def generate_words_and_clues_from_topic(topic: str, bypass_cache: bool = False,
+                                                  mock_fallback: bool = True) -> List[Dict[str, str]]:
+        """New method that returns both words and clues.
+        Responses are cached per (provider, model, prompt); bypass_cache forces a fresh LLM call.
+        With mock_fallback=False a misconfigured provider or failed call raises instead of
+        falling back to mock data; LLM_PROVIDER=mock still returns it."""
         config = LLMService.get_config()
         print(f"🔧 LLM_PROVIDER: {config['provider']}")
         
+        provider = LLMService._active_provider(config)
+        if provider is None:
+            print(f"⚠️  No valid LLM provider configured. Provider: {config['provider']}, Has API keys: OpenAI={bool(config['openai_key'])}, Anthropic={bool(config['anthropic_key'])}")
+            if not mock_fallback and config['provider'] != 'mock':
+                raise RuntimeError(f"No valid LLM provider configured (provider: {config['provider']})")
+            return LLMService._get_mock_word_clues(topic)
+        
+        hedge = LLMService._hedge_provider(provider, config)
+        prompt = LLMService.create_prompt(topic)
+        if not bypass_cache:
+            # A hedged call may have been won by the secondary provider, so check both
+            for cached_provider in filter(None, (provider, hedge)):
+                cached = LLMService.cache.get(
+                    LLMCache.make_key(cached_provider, LLMService.MODELS[cached_provider], prompt))
+                if cached is not None:
+                    print(f"⚡ Cached {LLMService.PROVIDER_NAMES[cached_provider]} response for topic: {topic}")
+                    return cached
+        
         try:
-            if config['provider'] == 'openai' and config['openai_key']:
-                print(f"🚀 Using OpenAI for topic: {topic}")
-                return await LLMService._call_openai(topic, config)
-            elif config['provider'] == 'anthropic' and config['anthropic_key']:
-                print(f"🚀 Using Anthropic for topic: {topic}")
-                return await LLMService._call_anthropic(topic, config)
-            elif config['provider'] == 'ollama':
-                print(f"🚀 Using Ollama for topic: {topic}")
-                return await LLMService._call_ollama(topic, config)
-            else:
-                print(f"⚠️  No valid LLM provider configured. Provider: {config['provider']}, Has API keys: OpenAI={bool(config['openai_key'])}, Anthropic={bool(config['anthropic_key'])}")
-                return LLMService._get_mock_word_clues(topic)
+            print(f"🚀 Using {LLMService.PROVIDER_NAMES[provider]} for topic: {topic}")
+            winner, word_clue_data = await LLMService._call_with_hedge(provider, hedge, topic, config)
         except Exception as e:
             print(f"❌ LLM call failed: {e}")
             print(f"Provider: {config['provider']}")
             print(f"API key present: {bool(config.get('openai_key' if config['provider'] == 'openai' else 'anthropic_key'))}")
+            if not mock_fallback:
+                raise
             print("Falling back to mock")
             return LLMService._get_mock_word_clues(topic)
+        
+        LLMService.cache.put(LLMCache.make_key(winner, LLMService.MODELS[winner], prompt), word_clue_data)
+        return word_clue_data
     
     @staticmethod
-    async def _call_openai(topic: str, config: dict) -> List[Dict[str, str]]:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                'https://api.openai.com/v1/chat/completions',
-                headers={
+    def _hedge_provider(primary: str, config: dict) -> Optional[str]:
+        """Configured secondary provider, if it is usable and differs from the primary"""
+        hedge = config['hedge_provider']
+        if not hedge or hedge == primary:
+            return None
+        if hedge == 'openai' and config['openai_key']:
+            return 'openai'
+        if hedge == 'anthropic' and config['anthropic_key']:
+            return 'anthropic'
+        if hedge == 'ollama':
+            return 'ollama'
+        print(f"⚠️  Ignoring LLM_HEDGE_PROVIDER={hedge}: provider not configured")
+        return None
+    
+    @staticmethod
+    def _hedge_delay_seconds(primary: str, config: dict) -> float:
+        """How long to give the primary before hedging: fixed if configured,
+        otherwise its observed p90 latency once there are enough samples
+        (including primaries cancelled by a hedge, so the p90 doesn't drift down)"""
+        if config['hedge_after_ms']:
+            return float(config['hedge_after_ms']) / 1000
+        p90 = LLMService.metrics.provider(primary).latency_percentile(0.9)
+        return (p90 if p90 is not None else config['hedge_default_ms']) / 1000
+    
+    @staticmethod
+    async def _call_with_hedge(primary: str, hedge: Optional[str], topic: str,
+                               config: dict) -> Tuple[str, List[Dict[str, str]]]:
+        """Call the primary provider; if it hasn't returned valid pairs by the hedge
+        delay (or fails), race the hedge provider against it. The first valid result
+        wins and the other call is cancelled. Returns (winning provider, pairs).
+        Raises if every call fails or the deadline passes."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config['deadline_ms'] / 1000
+        hedge_at = loop.time() + LLMService._hedge_delay_seconds(primary, config)
+        
+        tasks = {asyncio.create_task(LLMService._call_provider(primary, topic, config)): primary}
+        hedged = hedge is None
+        errors = []
+        try:
+            while True:
+                if not hedged and (not tasks or loop.time() >= hedge_at):
+                    print(f"🏁 Hedging with {LLMService.PROVIDER_NAMES[hedge]} for topic: {topic}")
+                    tasks[asyncio.create_task(LLMService._call_provider(hedge, topic, config))] = hedge
+                    hedged = True
+                if not tasks:
+                    raise RuntimeError(f"All providers failed: {'; '.join(errors)}")
+                if loop.time() >= deadline:
+                    raise asyncio.TimeoutError(f"No provider answered within {config['deadline_ms']:.0f} ms")
+                
+                wake_at = deadline if hedged else min(hedge_at, deadline)
+                done, _ = await asyncio.wait(tasks, timeout=wake_at - loop.time(),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks.pop(task)
+                    try:
+                        # Providers parse before returning, so a result here is valid pairs
+                        return provider, task.result()
+                    except Exception as e:
+                        print(f"❌ {LLMService.PROVIDER_NAMES[provider]} call failed: {e}")
+                        errors.append(f"{provider}: {e}")
+        finally:
+            # Cancel whichever calls lost the race
+            for task in tasks:
+                task.cancel()
+    
+    @staticmethod
+    def _active_provider(config: dict) -> Optional[str]:
+        """Provider to call given the config, or None if none is usable"""
+        if config['provider'] == 'openai' and config['openai_key']:
+            return 'openai'
+        if config['provider'] == 'anthropic' and config['anthropic_key']:
+            return 'anthropic'
+        if config['provider'] == 'ollama':
+            return 'ollama'
+        return None
+    
+    @staticmethod
+    async def _call_provider(provider: str, topic: str, config: dict) -> List[Dict[str, str]]:
+        if provider == 'openai':
+            return await LLMService._call_openai(topic, config)
+        if provider == 'anthropic':
+            return await LLMService._call_anthropic(topic, config)
+        return await LLMService._call_ollama(topic, config)
+    
+    @staticmethod
+    async def stream_words_and_clues_from_topic(topic: str, max_pairs: int = 30,
+                                               bypass_cache: bool = False) -> AsyncIterator[Dict[str, str]]:
+        """Yield word-clue pairs as the model produces them.
+        Rows are parsed as each line completes, and the model call is cut off once
+        max_pairs valid pairs have arrived. Falls back to mock data if the provider
+        fails before producing anything."""
+        config = LLMService.get_config()
+        provider = LLMService._active_provider(config)
+        if provider is None:
+            for pair in LLMService._get_mock_word_clues(topic)[:max_pairs]:
+                yield pair
+            return
+        
+        cache_key = LLMCache.make_key(provider, LLMService.MODELS[provider], LLMService.create_prompt(topic))
+        if not bypass_cache:
+            cached = LLMService.cache.get(cache_key)
+            if cached is not None:
+                for pair in cached[:max_pairs]:
+                    yield pair
+                return
+        
+        print(f"🚀 Streaming from {LLMService.PROVIDER_NAMES[provider]} for topic: {topic}")
+        pairs = []
+        buffer = ''
+        try:
+            async with aclosing(LLMService._stream_provider(provider, topic, config)) as stream:
+                async for text in stream:
+                    # Parse every line completed by this chunk; keep the partial tail
+                    *lines, buffer = (buffer + text).split('\n')
+                    for line in lines:
+                        pair = LLMService._parse_stream_line(line)
+                        if pair:
+                            pairs.append(pair)
+                            yield pair
+                            if len(pairs) >= max_pairs:
+                                break
+                    if len(pairs) >= max_pairs:
+                        # Leaving the stream closes the connection, so the model stops generating
+                        break
+            if len(pairs) < max_pairs:
+                pair = LLMService._parse_stream_line(buffer)
+                if pair:
+                    pairs.append(pair)
+                    yield pair
+        except Exception as e:
+            print(f"❌ LLM stream failed after {len(pairs)} pairs: {e}")
+            if not pairs:
+                print("Falling back to mock")
+                for pair in LLMService._get_mock_word_clues(topic)[:max_pairs]:
+                    yield pair
+            return
+        
+        # Only complete, usable responses are worth reusing
+        if len(pairs) >= 10:
+            LLMService.cache.put(cache_key, pairs)
+    
+    @staticmethod
+    def _parse_stream_line(line: str) -> Optional[Dict[str, str]]:
+        line = line.strip()
+        return LLMService._parse_csv_row(line) if LLMService._is_csv_line(line) else None
+    
+    @staticmethod
+    async def _stream_provider(provider: str, topic: str, config: dict) -> AsyncIterator[str]:
+        """Yield text deltas from the provider's streaming API"""
+        prompt = LLMService.create_prompt(topic)
+        if provider == 'openai':
+            request = {
+                'url': '/v1/chat/completions',
+                'headers': {
                     'Authorization': f"Bearer {config['openai_key']}",
                     'Content-Type': 'application/json'
                 },
-                json={
-                    'model': 'gpt-3.5-turbo',
-                    'messages': [{'role': 'user', 'content': LLMService.create_prompt(topic)}],
+                'json': {
+                    'model': LLMService.MODELS['openai'],
+                    'messages': [{'role': 'user', 'content': prompt}],
                     'max_tokens': 1000,
-                    'temperature': 0.7
-                },
-                timeout=30.0
-            )
-            response.raise_for_status()
-            data = response.json()
-            content = data['choices'][0]['message']['content']
-            return LLMService._parse_csv_content(content)
-    
-    @staticmethod
-    async def _call_anthropic(topic: str, config: dict) -> List[Dict[str, str]]:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                'https://api.anthropic.com/v1/messages',
-                headers={
+                    'temperature': 0.7,
+                    'stream': True
+                }
+            }
+        elif provider == 'anthropic':
+            request = {
+                'url': '/v1/messages',
+                'headers': {
                     'x-api-key': config['anthropic_key'],
                     'Content-Type': 'application/json',
                     'anthropic-version': '2023-06-01'
                 },
-                json={
-                    'model': 'claude-3-haiku-20240307',
+                'json': {
+                    'model': LLMService.MODELS['anthropic'],
                     'max_tokens': 1000,
-                    'messages': [{'role': 'user', 'content': LLMService.create_prompt(topic)}]
-                },
-                timeout=30.0
-            )
-            response.raise_for_status()
-            data = response.json()
-            content = data['content'][0]['text']
-            return LLMService._parse_csv_content(content)
+                    'messages': [{'role': 'user', 'content': prompt}],
+                    'stream': True
+                }
+            }
+        else:
+            request = {
+                'url': '/api/generate',
+                'json': {
+                    'model': LLMService.MODELS['ollama'],
+                    'prompt': prompt,
+                    'stream': True
+                }
+            }
+        
+        trace = CallTrace()
+        error = False
+        try:
+            async with LLMService.get_client(provider).stream('POST', extensions={'trace': trace}, **request) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    text = LLMService._stream_text(provider, line)
+                    if text:
+                        yield text
+        except Exception:
+            error = True
+            raise
+        finally:
+            trace.finish()
+            LLMService.metrics.provider(provider).record(trace, error=error, streamed=True)
+    
+    @staticmethod
+    def _stream_text(provider: str, line: str) -> Optional[str]:
+        """Extract the text delta from one line of a provider's stream"""
+        if provider == 'ollama':
+            # Newline-delimited JSON objects
+            if not line.strip():
+                return None
+            return json.loads(line).get('response')
+        
+        # OpenAI and Anthropic send server-sent events
+        if not line.startswith('data:'):
+            return None
+        data = line[len('data:'):].strip()
+        if not data or data == '[DONE]':
+            return None
+        event = json.loads(data)
+        if provider == 'openai':
+            choices = event.get('choices') or [{}]
+            return choices[0].get('delta', {}).get('content')
+        if event.get('type') == 'content_block_delta':
+            return event.get('delta', {}).get('text')
+        return None
+    
+    @staticmethod
+    async def _call_openai(topic: str, config: dict) -> List[Dict[str, str]]:
+        response = await LLMService._post(
+            'openai',
+            '/v1/chat/completions',
+            headers={
+                'Authorization': f"Bearer {config['openai_key']}",
+                'Content-Type': 'application/json'
+            },
+            json={
+                'model': LLMService.MODELS['openai'],
+                'messages': [{'role': 'user', 'content': LLMService.create_prompt(topic)}],
+                'max_tokens': 1000,
+                'temperature': 0.7
+            }
+        )
+        data = response.json()
+        content = data['choices'][0]['message']['content']
+        return LLMService._parse_csv_content(content)
+    
+    @staticmethod
+    async def _call_anthropic(topic: str, config: dict) -> List[Dict[str, str]]:
+        response = await LLMService._post(
+            'anthropic',
+            '/v1/messages',
+            headers={
+                'x-api-key': config['anthropic_key'],
+                'Content-Type': 'application/json',
+                'anthropic-version': '2023-06-01'
+            },
+            json={
+                'model': LLMService.MODELS['anthropic'],
+                'max_tokens': 1000,
+                'messages': [{'role': 'user', 'content': LLMService.create_prompt(topic)}]
+            }
+        )
+        data = response.json()
+        content = data['content'][0]['text']
+        return LLMService._parse_csv_content(content)
     
     @staticmethod
     async def _call_ollama(topic: str, config: dict) -> List[Dict[str, str]]:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{config['ollama_url']}/api/generate",
-                json={
-                    'model': 'llama2',
-                    'prompt': LLMService.create_prompt(topic),
-                    'stream': False
-                },
-                timeout=60.0
-            )
-            response.raise_for_status()
-            data = response.json()
-            content = data['response']
-            return LLMService._parse_csv_content(content)
+        response = await LLMService._post(
+            'ollama',
+            '/api/generate',
+            json={
+                'model': LLMService.MODELS['ollama'],
+                'prompt': LLMService.create_prompt(topic),
+                'stream': False
+            }
+        )
+        data = response.json()
+        content = data['response']
+        return LLMService._parse_csv_content(content)
     
     @staticmethod
     def _parse_words(content: str) -> List[str]:
@@ -194,11 +539,7 @@ Now generate 30 word-clue pairs for the topic: "{topic}". Make them clever, witt
             
             for line in lines:
                 line = line.strip()
-                # Skip empty lines, markdown, or explanatory text
-                if not line or line.startswith('#') or line.startswith('```') or line.lower().startswith('here'):
-                    continue
-                # Look for lines with comma separation
-                if ',' in line and not line.lower().startswith('word,clue'):
+                if LLMService._is_csv_line(line):
                     csv_lines.append(line)
             
             if not csv_lines:
@@ -207,23 +548,9 @@ Now generate 30 word-clue pairs for the topic: "{topic}". Make them clever, witt
             # Parse CSV data
             word_clue_pairs = []
             for line in csv_lines:
-                try:
-                    # Use CSV reader to handle quoted content properly
-                    csv_reader = csv.reader([line])
-                    row = next(csv_reader)
-                    
-                    if len(row) >= 2:
-                        word = row[0].strip().upper()
-                        clue = row[1].strip()
-                        
-                        # Validate word
-                        if word.isalpha() and 3 <= len(word) <= 15:
-                            word_clue_pairs.append({
-                                'word': word,
-                                'clue': clue
-                            })
-                except (csv.Error, ValueError):
-                    continue
+                pair = LLMService._parse_csv_row(line)
+                if pair:
+                    word_clue_pairs.append(pair)
             
             if len(word_clue_pairs) < 10:
                 raise ValueError(f"Too few valid word-clue pairs: {len(word_clue_pairs)}")
@@ -234,6 +561,34 @@ Now generate 30 word-clue pairs for the topic: "{topic}". Make them clever, witt
             print(f"Error parsing CSV content: {e}")
             raise ValueError(f"Could not parse CSV content: {e}")
     
+    @staticmethod
+    def _is_csv_line(line: str) -> bool:
+        """True for lines that look like WORD,CLUE rows"""
+        # Skip empty lines, markdown, or explanatory text
+        if not line or line.startswith('#') or line.startswith('```') or line.lower().startswith('here'):
+            return False
+        # Look for lines with comma separation
+        return ',' in line and not line.lower().startswith('word,clue')
+    
+    @staticmethod
+    def _parse_csv_row(line: str) -> Optional[Dict[str, str]]:
+        """Parse one WORD,CLUE line, or return None if it isn't a valid pair"""
+        try:
+            # Use CSV reader to handle quoted content properly
+            row = next(csv.reader([line]))
+        except (csv.Error, ValueError, StopIteration):
+            return None
+        
+        if len(row) < 2:
+            return None
+        word = row[0].strip().upper()
+        clue = row[1].strip()
+        
+        # Validate word
+        if word.isalpha() and 3 <= len(word) <= 15:
+            return {'word': word, 'clue': clue}
+        return None
+    
     @staticmethod
     def _get_mock_words(topic: str) -> List[str]:
         topic_lower = topic.lower()
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import List, Optional, Tuple
+from src.crossword_generator import CrosswordGenerator
+from src.models import CrosswordGrid, Direction
+
+# Number of seeded orderings tried per puzzle
+NUM_SEEDS = int(os.getenv("CROSSWORD_SEEDS", "32"))
+# Worker processes shared by all requests (the generator is CPU-bound pure Python)
+NUM_WORKERS = int(os.getenv("CROSSWORD_WORKERS", str(os.cpu_count() or 1)))
+
+# Scoring weights - words placed dominates, the rest break ties between layouts
+WORD_WEIGHT = 100.0
+INTERSECTION_WEIGHT = 5.0
+DENSITY_WEIGHT = 10.0
+COMPACTNESS_WEIGHT = 5.0
+
+_pool: Optional[ProcessPoolExecutor] = None
+# get_pool runs on threadpool workers - concurrent first requests must not each start a pool
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared worker pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=NUM_WORKERS)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def seed_from_text(text: str) -> int:
+    """Stable seed for a string (unlike hash(), the same across processes and restarts)"""
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def score_crossword(crossword: CrosswordGrid) -> float:
+    """Score a layout on words placed, intersections, fill density and compactness"""
+    placements = crossword.word_placements
+    if not placements:
+        return 0.0
+
+    min_row = min_col = crossword.width
+    max_row = max_col = 0
+    letters = 0
+    for placement in placements:
+        if placement.direction == Direction.HORIZONTAL:
+            end_row, end_col = placement.start_row, placement.start_col + len(placement.word) - 1
+        else:
+            end_row, end_col = placement.start_row + len(placement.word) - 1, placement.start_col
+        min_row = min(min_row, placement.start_row)
+        min_col = min(min_col, placement.start_col)
+        max_row = max(max_row, end_row)
+        max_col = max(max_col, end_col)
+        letters += len(placement.word)
+
+    filled = sum(1 for row in crossword.grid for cell in row if cell is not None)
+    intersections = letters - filled
+    box_area = (max_row - min_row + 1) * (max_col - min_col + 1)
+    density = filled / box_area
+    compactness = 1 - box_area / (crossword.width * crossword.height)
+
+    return (WORD_WEIGHT * len(placements)
+            + INTERSECTION_WEIGHT * intersections
+            + DENSITY_WEIGHT * density
+            + COMPACTNESS_WEIGHT * compactness)
+
+
+def _seeded_order(words: List[str], seed: int, index: int) -> List[str]:
+    """Word order for the index-th seed; the first run keeps the caller's order"""
+    if index == 0:
+        return list(words)
+    order = list(words)
+    random.Random(seed + index).shuffle(order)
+    return order
+
+
+def _best_of_seeds(words: List[str], grid_size: int, seed: int, indices: List[int],
+                   deadline: float) -> Optional[Tuple[float, int, CrosswordGrid]]:
+    """Worker: run the greedy generator over several seeded orderings, keep the best.
+    Returns (score, seed index, crossword), or None if the deadline passed first."""
+    best = None
+    for index in indices:
+        if time.time() >= deadline:
+            break
+        crossword = CrosswordGenerator(_seeded_order(words, seed, index), grid_size).generate_crossword()
+        score = score_crossword(crossword)
+        if best is None or score > best[0]:
+            best = (score, index, crossword)
+    return best
+
+
+def generate_best_of_n(words: List[str], grid_size: int = 15, seed: int = 0,
+                       num_seeds: int = NUM_SEEDS, deadline_ms: int = 2000) -> CrosswordGrid:
+    """Generate num_seeds seeded layouts across the worker pool and return the best.
+
+    The same (words, seed) always gives the same puzzle as long as every ordering
+    finishes before the deadline; orderings still running at the deadline are dropped."""
+    deadline = time.time() + deadline_ms / 1000.0
+    chunks = [list(range(start, num_seeds, NUM_WORKERS)) for start in range(min(NUM_WORKERS, num_seeds))]
+    futures = [
+        get_pool().submit(_best_of_seeds, words, grid_size, seed, chunk, deadline)
+        for chunk in chunks
+    ]
+    done, not_done = wait(futures, timeout=deadline_ms / 1000.0 + 0.5)
+    for future in not_done:
+        future.cancel()
+
+    best = None
+    for future in done:
+        result = future.result()
+        # Ties go to the lowest seed index so the outcome doesn't depend on timing
+        if result is not None and (best is None or (result[0], -result[1]) > (best[0], -best[1])):
+            best = result
+
+    if best is None:
+        # Nothing finished in time - fall back to a single greedy pass
+        return CrosswordGenerator(words, grid_size).generate_crossword()
+    return best[2]